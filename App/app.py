@@ -19,21 +19,25 @@ login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 
+from threads import set_thread_limit, get_task_threads
+# the evaluations run in the web worker, they get the same share of the cores as each job
+set_thread_limit(get_task_threads())
+
 from routes import *
 
 # Create the database tables
 with app.app_context():
-    from models import Dataset, User
+    from jobs import recover_jobs
+    from resumable import recover_uploads
+    from utils import upgrade_database, remove_stale_datasets
     if not os.path.exists('database.db'):
         db.create_all()
+    upgrade_database()
 
     # Delete datasets that do not have a corresponding user or the file does not exist
-    datasets = Dataset.query.all()
-    for dataset in datasets:
-        if not User.query.get(dataset.user_id) or not os.path.exists(dataset.path):
-            db.session.delete(dataset)
-
-            if os.path.exists(dataset.path):
-                os.remove(dataset.path)
-    db.session.commit()
+    remove_stale_datasets()
+
+    # Send again to the pool the jobs and the checks of the uploads left behind by a recycled worker
+    recover_jobs()
+    recover_uploads()
 
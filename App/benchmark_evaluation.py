@@ -0,0 +1,63 @@
+import sys
+import time
+import warnings
+
+# dataset of the benchmark, relative to the App directory
+DATASET = '../examples/adult.csv'
+
+
+# Return the real data, a synthetic table of the same size and the metadata of both
+def get_benchmark_data(path, rows=None):
+    import pandas as pd
+    from sdv.metadata import SingleTableMetadata
+    from sdv.single_table import GaussianCopulaSynthesizer
+
+    real_data = pd.read_csv(path)
+    if rows is not None:
+        real_data = pd.concat([real_data] * (rows // len(real_data) + 1), ignore_index=True).head(rows)
+    metadata = SingleTableMetadata()
+    metadata.detect_from_dataframe(real_data)
+    synthesizer = GaussianCopulaSynthesizer(metadata)
+    synthesizer.fit(real_data)
+    return real_data, synthesizer.sample(len(real_data)), metadata.to_dict()
+
+
+# Return the seconds taken by the given function and what it returns, the best of the given runs
+def measure(function, runs):
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = function()
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best, result
+
+
+# Compare the time and the scores of the SDMetrics quality report and of the fast evaluation
+def main(path=DATASET, rows=None, runs=3):
+    from sdmetrics.reports.single_table import QualityReport
+    from fidelity import evaluate_fidelity
+
+    warnings.filterwarnings('ignore')
+    real_data, synthetic_data, metadata = get_benchmark_data(path, rows)
+    print('{}: {} rows, {} columns'.format(path, len(real_data), len(real_data.columns)))
+
+    def generate_report():
+        report = QualityReport()
+        report.generate(real_data, synthetic_data, metadata, verbose=False)
+        return report
+
+    report_seconds, report = measure(generate_report, runs)
+    fast_seconds, fidelity = measure(lambda: evaluate_fidelity(real_data, synthetic_data, metadata), runs)
+
+    print('QualityReport   {:8.3f} s  score {:.6f}'.format(report_seconds, report.get_score()))
+    print('fast evaluation {:8.3f} s  score {:.6f}  ({:.1f}x faster)'.format(
+        fast_seconds, fidelity['score'], report_seconds / fast_seconds))
+    for full, fast in zip(report.get_properties().to_dict(orient='records'), fidelity['properties']):
+        print('  {:<20} {:.6f} {:.6f}  difference {:.2e}'.format(
+            full['Property'], full['Score'], fast['Score'], abs(full['Score'] - fast['Score'])))
+
+
+# Run this file from the App directory: python benchmark_evaluation.py [rows] [runs]
+if __name__ == '__main__':
+    main(rows=int(sys.argv[1]) if len(sys.argv) > 1 else None, runs=int(sys.argv[2]) if len(sys.argv) > 2 else 3)
@@ -0,0 +1,77 @@
+import json
+import subprocess
+import sys
+import time
+import warnings
+
+# dataset of the benchmark, relative to the App directory
+DATASET = '../examples/adult.csv'
+
+# code run by a fresh process, it exports the figures of the report to images with its first Plotly exporter
+COLD_CODE = '''
+import json
+import sys
+import time
+import plotly.io as pio
+
+figures = [pio.from_json(figure) for figure in json.load(sys.stdin)]
+start = time.perf_counter()
+for figure in figures:
+    figure.to_image(format='png')
+print(json.dumps({'seconds': time.perf_counter() - start}))
+'''
+
+
+# Return the figures of the quality report of the dataset against a synthetic table of the same size
+def get_report_figures(path):
+    from sdmetrics.reports.single_table import QualityReport
+    from benchmark_evaluation import get_benchmark_data
+
+    real_data, synthetic_data, metadata = get_benchmark_data(path)
+    report = QualityReport()
+    report.generate(real_data, synthetic_data, metadata, verbose=False)
+    return [report.get_visualization(property_name='Column Shapes'),
+            report.get_visualization(property_name='Column Pair Trends')]
+
+
+# Return the seconds a fresh process takes to export the figures to images, launching its exporter
+def measure_cold_export(figures):
+    output = subprocess.run([sys.executable, '-c', COLD_CODE], capture_output=True, text=True, check=True,
+                            input=json.dumps([figure.to_json() for figure in figures])).stdout
+    return json.loads(output.strip().splitlines()[-1])['seconds']
+
+
+# Return the seconds taken by the given function on each figure, the best of the given runs
+def measure(function, figures, runs):
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        for figure in figures:
+            function(figure)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+
+# Compare the figures per second of the report exported to images, by a fresh and by a running exporter,
+# with the figures per second of the report sent as Plotly JSON for the browser to draw
+def main(path=DATASET, runs=3):
+    warnings.filterwarnings('ignore')
+    figures = get_report_figures(path)
+    sizes = [len(figure.to_json()) for figure in figures]
+    print('{}: {} report figures, {:.1f} KB of JSON each'.format(path, len(figures), sum(sizes) / len(sizes) / 1024))
+
+    cold_seconds = measure_cold_export(figures)
+    # the first export of this process launches its exporter, the runs measure it running
+    figures[0].to_image(format='png')
+    warm_seconds = measure(lambda figure: figure.to_image(format='png'), figures, runs)
+    json_seconds = measure(lambda figure: json.loads(figure.to_json()), figures, runs)
+
+    for name, seconds in [('images, fresh exporter', cold_seconds), ('images, running exporter', warm_seconds),
+                          ('Plotly JSON for the browser', json_seconds)]:
+        print('{:<28} {:8.3f} s  {:8.1f} figures/s'.format(name, seconds, len(figures) / seconds))
+
+
+# Run this file from the App directory: python benchmark_plots.py [runs]
+if __name__ == '__main__':
+    main(runs=int(sys.argv[1]) if len(sys.argv) > 1 else 3)
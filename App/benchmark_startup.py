@@ -0,0 +1,54 @@
+import json
+import subprocess
+import sys
+
+# libraries that should only be loaded by the code paths that fit, sample or evaluate
+HEAVY_MODULES = ['torch', 'sdv', 'sdmetrics', 'ctgan', 'matplotlib', 'plotly', 'sklearn', 'scipy', 'pandas']
+
+# code run by each fresh worker, it boots the app and serves a light page
+WORKER_CODE = '''
+import json
+import resource
+import sys
+import time
+
+start = time.perf_counter()
+from app import app
+import_seconds = time.perf_counter() - start
+
+start = time.perf_counter()
+response = app.test_client().get('/login')
+request_seconds = time.perf_counter() - start
+
+print(json.dumps({
+    'import_seconds': import_seconds,
+    'request_seconds': request_seconds,
+    'status': response.status_code,
+    'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'heavy_modules': [module for module in %r if module in sys.modules],
+}))
+''' % HEAVY_MODULES
+
+
+# Boot a fresh worker in a new interpreter and return its measures
+def measure_worker():
+    output = subprocess.run([sys.executable, '-c', WORKER_CODE], capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+# Report the import time and memory of freshly booted workers serving /login
+def main(runs=5):
+    results = [measure_worker() for _ in range(runs)]
+    for result in results:
+        print('import {:.2f} s, first request {:.3f} s, status {}, peak RSS {:.0f} MB'.format(
+            result['import_seconds'], result['request_seconds'], result['status'], result['rss_mb']))
+
+    import_seconds = sorted(result['import_seconds'] for result in results)
+    rss_mb = sorted(result['rss_mb'] for result in results)
+    print('median import {:.2f} s, median peak RSS {:.0f} MB'.format(import_seconds[runs // 2], rss_mb[runs // 2]))
+    print('heavy modules loaded: {}'.format(', '.join(results[-1]['heavy_modules']) or 'none'))
+
+
+# Run this file from the App directory: python benchmark_startup.py [runs]
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
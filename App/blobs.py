@@ -0,0 +1,76 @@
+from app import app, db
+from models import Blob
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+import os
+import config as C
+
+
+# Return the paths of the columnar file and of the csv of the content with the given checksum
+def get_blob_paths(checksum):
+    directory = os.path.join(app.root_path, C.BLOB_PATH)
+    return os.path.join(directory, checksum + '.feather'), os.path.join(directory, checksum + '.csv')
+
+
+# Add a reference to the files of the content with the given checksum,
+# returns its Blob or None if the content is not stored
+def acquire_blob(checksum):
+    # the count is increased in the database so two uploads of the same content never miss each other
+    result = db.session.execute(update(Blob).where(Blob.checksum == checksum).values(refcount=Blob.refcount + 1))
+    db.session.commit()
+    if result.rowcount == 0:
+        return None
+    return db.session.get(Blob, checksum)
+
+
+# Store the files of a new content with a first reference: convert the uploaded csv to the columnar file and
+# move the csv next to it if it is kept. Returns the Blob
+def store_blob(checksum, csv_path, columns=None):
+    from utils import convert_to_columnar
+
+    path, blob_csv_path = get_blob_paths(checksum)
+    # the directory is only created by build_system, which the gunicorn deployment does not run
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    while True:
+        convert_to_columnar(csv_path, path, columns)
+        db.session.add(Blob(checksum=checksum, path=path, csv_path=blob_csv_path if C.KEEP_CSV_UPLOADS else None,
+                            refcount=1))
+        try:
+            db.session.commit()
+            break
+        except IntegrityError:
+            # another upload stored the same content at the same time, the files it wrote are the same
+            db.session.rollback()
+            blob = acquire_blob(checksum)
+            if blob is not None:
+                os.remove(csv_path)
+                return blob
+            # and its last dataset was deleted before the reference was added, with the files, so they are
+            # stored again from the csv, which is only moved once the Blob is stored
+    if C.KEEP_CSV_UPLOADS:
+        os.replace(csv_path, blob_csv_path)
+    else:
+        os.remove(csv_path)
+    return db.session.get(Blob, checksum)
+
+
+# Remove the reference of the dataset to the files of its content, and the files with the last one.
+# Returns False if the dataset does not point at a blob, like the datasets uploaded before them
+def release_blob(dataset):
+    checksum = dataset.checksum
+    result = db.session.execute(update(Blob).where(Blob.checksum == checksum, Blob.path == dataset.path)
+                                .values(refcount=Blob.refcount - 1))
+    # the update changed nothing, the changes the caller did not commit yet are kept
+    if result.rowcount == 0:
+        return False
+
+    # the files are removed before the count is committed, so an upload of the same content waits for them
+    # and stores them again
+    blob = db.session.get(Blob, checksum, populate_existing=True)
+    if blob.refcount <= 0:
+        for path in [blob.path, blob.csv_path]:
+            if path is not None and os.path.exists(path):
+                os.remove(path)
+        db.session.delete(blob)
+    db.session.commit()
+    return True
@@ -0,0 +1,107 @@
+import bz2
+import gzip
+import lzma
+import os
+import config as C
+
+# compression of each file extension, the uploads and the synthetic files can use any of them
+COMPRESSIONS = {'.gz': 'gzip', '.bz2': 'bz2', '.xz': 'xz', '.zst': 'zstd'}
+EXTENSIONS = {compression: extension for extension, compression in COMPRESSIONS.items()}
+# type of the compressed files when they are downloaded
+MIMETYPES = {'gzip': 'application/gzip', 'bz2': 'application/x-bzip2', 'xz': 'application/x-xz', 'zstd': 'application/zstd'}
+
+# errors of the decompressors when the data is not valid or ends before its end marker
+DECOMPRESSION_ERRORS = (OSError, EOFError, lzma.LZMAError)
+
+
+# Return the compression of the file with the given name from its extension, None for a plain file
+def get_compression(name):
+    return COMPRESSIONS.get(os.path.splitext(name)[1].lower())
+
+
+# Return the name of the file without the extension of its compression
+def get_uncompressed_name(name):
+    return os.path.splitext(name)[0] if get_compression(name) else name
+
+
+# Return the name of the file with the extension of the given compression
+def get_compressed_name(name, compression):
+    return name + EXTENSIONS[compression] if compression else name
+
+
+# Return a binary stream that decompresses the given binary stream as it is read
+def decompress_stream(stream, compression):
+    if compression is None:
+        return stream
+    if compression == 'gzip':
+        return gzip.GzipFile(fileobj=stream, mode='rb')
+    if compression == 'bz2':
+        return bz2.BZ2File(stream, mode='rb')
+    if compression == 'xz':
+        return lzma.LZMAFile(stream, mode='rb')
+
+    import pyarrow as pa
+    # zstd is read with the codec of pyarrow, so the zstandard package is not needed
+    return pa.CompressedInputStream(stream, 'zstd')
+
+
+# Open the file for reading as binary, decompressing it by its extension
+def open_data_file(path):
+    compression = get_compression(path)
+    if compression is None:
+        return open(path, 'rb')
+    if compression == 'gzip':
+        return gzip.open(path, 'rb')
+    if compression == 'bz2':
+        return bz2.open(path, 'rb')
+    if compression == 'xz':
+        return lzma.open(path, 'rb')
+
+    import pyarrow as pa
+    return pa.CompressedInputStream(path, 'zstd')
+
+
+# Return the function that compresses bytes to a complete member of the given compression,
+# with the level configured for it
+def get_compressor(compression):
+    level = C.SYNTHETIC_COMPRESSION_LEVELS[compression]
+    if compression == 'gzip':
+        return lambda data: gzip.compress(data, compresslevel=level)
+    if compression == 'bz2':
+        return lambda data: bz2.compress(data, compresslevel=level)
+    if compression == 'xz':
+        return lambda data: lzma.compress(data, preset=level)
+
+    import pyarrow as pa
+    codec = pa.Codec('zstd', compression_level=level)
+    return lambda data: codec.compress(data, asbytes=True)
+
+
+# Text file that writes each piece of text as a complete compressed member. The members of a file are read as
+# a single stream, so the file can be read and downloaded after any write while the next ones are compressed
+class CompressedTextFile:
+    def __init__(self, path, compression):
+        self.file = open(path, 'wb')
+        self.compress = get_compressor(compression)
+
+    def write(self, text):
+        return self.file.write(self.compress(text.encode('utf-8')))
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+# Open the file for writing text, compressed with the given compression if there is one
+def open_text_file(path, compression=None):
+    if compression is None:
+        return open(path, 'w', newline='')
+    return CompressedTextFile(path, compression)
@@ -1,8 +1,93 @@
 WORKERS = 5
+# gunicorn worker processes, read by gunicorn.py, each one runs its own pool of WORKERS job processes
+WEB_WORKERS = 1
+
+# cores shared by the fits, samplings and evaluations running at the same time, None uses all of them.
+# Each job process and the evaluations of each web worker get an equal share, and torch, MKL, OpenBLAS
+# and numexpr are limited to it so the concurrent tasks do not oversubscribe the machine
+THREAD_BUDGET = None
+
+# synthesizers fitted at the same time when comparing them in the leaderboard
+LEADERBOARD_WORKERS = WORKERS
+
+# times a job is sent again to the pool after its process died
+JOB_MAX_ATTEMPTS = 3
 
 DATASET_PATH = 'static/data/'
+# files of the uploads, named by the sha256 of their content and shared by the datasets that uploaded it
+BLOB_PATH = 'static/data/blobs/'
 PLOT_PATH = 'static/plots/'
 SYNTHETIC_PATH = 'static/synthetic/'
+# fitted synthesizers are pickled here, outside static/ so they are never served
+MODEL_PATH = 'models/'
+# chunks of the uploads in progress, outside static/ too
+CHUNK_PATH = 'chunks/'
+
+# uploads are converted to Arrow IPC (feather) files that are memory-mapped when read,
+# 'lz4' or 'zstd' save disk space but the columns must be decompressed on every load
+COLUMNAR_COMPRESSION = 'uncompressed'
+# keep the uploaded csv next to its columnar copy
+KEEP_CSV_UPLOADS = False
+# uploads are read and written in chunks of this many bytes while every row is checked,
+# the dialect and the headers are sniffed once on the first lines
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+UPLOAD_SNIFF_LINES = 20
+# rows whose dtypes are inferred at a time, each distinct value of a column in the block is checked once
+UPLOAD_BLOCK_ROWS = 10000
+# the upload page sends the files above this size in chunks, each chunk is a request acknowledged once it is
+# saved, so an interrupted upload resumes from the last acknowledged chunk
+UPLOAD_RESUMABLE_MIN_BYTES = 32 * 1024 * 1024
+UPLOAD_RESUMABLE_CHUNK_BYTES = 8 * 1024 * 1024
+# processes of each web worker that check the chunked uploads while their chunks arrive
+UPLOAD_WORKERS = 2
+# seconds without chunks after which the upload is given up
+UPLOAD_EXPIRE_SECONDS = 3600
+
+# rows sampled and appended to the synthetic file at a time
+SAMPLE_BATCH_ROWS = 100000
+# compression of the synthetic files selected by default in the generate form, None, 'gzip', 'bz2', 'xz' or 'zstd'.
+# Each batch is compressed on its own, so the file can be downloaded while it is being written
+SYNTHETIC_COMPRESSION = None
+# level of each compression, higher levels spend more CPU for smaller files (gzip and bz2 1-9, xz 0-9, zstd 1-22)
+SYNTHETIC_COMPRESSION_LEVELS = {'gzip': 6, 'bz2': 9, 'xz': 6, 'zstd': 3}
+# above these rows the pair plots do not draw every point: 'sample' draws a random sample of this many rows,
+# 'hexbin' and 'hist2d' draw the density of all the rows in a grid of DENSITY_GRID cells along each axis
+SCATTER_MAX_ROWS = 50000
+SCATTER_MODE = 'sample'
+DENSITY_GRID = 60
+# evaluation shown when the user does not choose one: 'full' runs the SDMetrics quality report,
+# 'fast' computes the same Column Shapes and Column Pair Trends scores with NumPy over whole columns
+EVALUATION_MODE = 'full'
+# the 'approximate' evaluation scores bootstrap samples of APPROXIMATE_SAMPLE_ROWS rows of each dataset with the
+# fast evaluation, between the minimum and maximum of samples, until the APPROXIMATE_CONFIDENCE interval of the
+# score is narrower than APPROXIMATE_TARGET_WIDTH. The interval is the one of the mean of the samples, more and
+# larger samples give a narrower one
+APPROXIMATE_SAMPLE_ROWS = 100000
+APPROXIMATE_MIN_SAMPLES = 3
+APPROXIMATE_MAX_SAMPLES = 10
+APPROXIMATE_TARGET_WIDTH = 0.02
+APPROXIMATE_CONFIDENCE = 0.95
+APPROXIMATE_SEED = 0
+# processes of a job that sample the batches at the same time, they share the threads of the job
+SAMPLE_WORKERS = 4
+# seed of the synthetic data when the user does not give one
+SAMPLE_SEED = 0
+
+# seed of the sample drawn when the synthesizer is fitted on at most a given number of rows
+FIT_SAMPLE_SEED = 0
+
+# CTGAN, CopulaGAN and TVAE save a checkpoint every given number of epochs
+CHECKPOINT_EVERY_EPOCHS = 10
+# seed of their fits, so a resumed fit rebuilds the same networks
+FIT_SEED = 0
+# early stopping waits these epochs for the loss to improve by this fraction
+EARLY_STOPPING_PATIENCE = 20
+EARLY_STOPPING_MIN_DELTA = 0.01
+
+# fitted synthesizers kept in memory by each job process
+MODEL_CACHE_ENTRIES = 4
+# disk space used by the fitted synthesizers before the least recently used are removed
+MODEL_REGISTRY_MAX_BYTES = 2 * 1024 ** 3
 
 
 DATA_BASE_URI = 'sqlite:///database.db'
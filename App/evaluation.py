@@ -0,0 +1,101 @@
+from app import app, db
+from models import Job
+from utils import get_file_checksum, get_file_signature
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import config as C
+
+# file with the score and the property tables, next to the images of the evaluation
+EVALUATION_FILE = 'evaluation.json'
+# evaluation modes, the full SDMetrics quality report, the fast evaluation of the same properties
+# and its estimate on bootstrap samples of the rows
+EVALUATION_MODES = ['full', 'fast', 'approximate']
+
+
+# Return the checksum of the synthetic file of the dataset, stored by the job that wrote it
+def get_synthetic_checksum(dataset, path):
+    job = Job.query.filter_by(dataset_id=dataset.id, kind='generate', status='finished', result_path=path) \
+        .order_by(Job.finished_at.desc()).first()
+    signature = get_file_signature(path)
+    if job is not None and job.result_checksum is not None and job.result_signature == signature:
+        return job.result_checksum
+
+    # files written before the checksum was stored, or changed after the job, are hashed again
+    checksum = get_file_checksum(path)
+    if job is not None:
+        job.result_checksum = checksum
+        job.result_signature = signature
+        db.session.commit()
+    return checksum
+
+
+# Return the key of the evaluation of the synthetic data against the real data, from the hashes of both files
+def get_evaluation_key(real_checksum, synthetic_checksum):
+    return hashlib.sha256((real_checksum + ':' + synthetic_checksum).encode('utf-8')).hexdigest()
+
+
+# Return the directory, relative to the app, where the evaluation with the given key is stored
+def get_evaluation_dir(dataset_id, key):
+    return C.PLOT_PATH + str(dataset_id) + '_' + key + '/'
+
+
+# Return the name of the evaluation file of the given mode, both modes share the plots of the columns and pairs
+def get_evaluation_name(mode):
+    return EVALUATION_FILE if mode == 'full' else 'evaluation_' + mode + '.json'
+
+
+# Return the stored evaluation with the given key, or None if it was never computed
+def load_evaluation(dataset_id, key, mode='full'):
+    path = get_evaluation_file(dataset_id, key, get_evaluation_name(mode))
+    if not os.path.exists(path):
+        return None
+    with open(path) as file:
+        return json.load(file)
+
+
+# Return the path of a file of the evaluation with the given key
+def get_evaluation_file(dataset_id, key, name):
+    return os.path.join(app.root_path, get_evaluation_dir(dataset_id, key), name)
+
+
+# Render files with the given function in a temporary directory and move them to the evaluation with the given key,
+# returning what the function returns. The function receives the temporary directory
+def render_evaluation_files(dataset_id, key, render):
+    directory = os.path.join(app.root_path, get_evaluation_dir(dataset_id, key))
+    # unique for each request, the name starts like the evaluation so it is removed with it
+    tmp_directory = tempfile.mkdtemp(prefix=os.path.basename(directory.rstrip('/')) + '.', suffix='.tmp',
+                                     dir=os.path.join(app.root_path, C.PLOT_PATH))
+    try:
+        result = render(tmp_directory)
+        os.makedirs(directory, exist_ok=True)
+        # each file appears complete, the evaluation files are moved last so they mark a complete evaluation
+        for name in sorted(os.listdir(tmp_directory), key=lambda name: name.endswith('.json')):
+            os.replace(os.path.join(tmp_directory, name), os.path.join(directory, name))
+    finally:
+        shutil.rmtree(tmp_directory, ignore_errors=True)
+    return result
+
+
+# Compute the evaluation with the given function and store it under its key.
+# The function receives the directory for the images and returns the score and property tables
+def save_evaluation(dataset_id, key, compute, mode='full'):
+    def render(directory):
+        evaluation = compute(directory)
+        with open(os.path.join(directory, get_evaluation_name(mode)), 'w') as file:
+            json.dump(evaluation, file)
+
+    render_evaluation_files(dataset_id, key, render)
+    return load_evaluation(dataset_id, key, mode)
+
+
+# Remove the stored evaluations of the dataset, when its synthetic data is written again or it is deleted
+def remove_evaluations(dataset_id):
+    directory = os.path.join(app.root_path, C.PLOT_PATH)
+    if not os.path.exists(directory):
+        return
+    for name in os.listdir(directory):
+        if name.startswith(str(dataset_id) + '_'):
+            shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
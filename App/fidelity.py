@@ -0,0 +1,257 @@
+import numpy as np
+import pandas as pd
+
+# sdtypes compared by their distribution (KS) and by their frequencies (TVD), as SDMetrics does
+CONTINUOUS_SDTYPES = ['numerical', 'datetime']
+DISCRETE_SDTYPES = ['categorical', 'boolean']
+
+
+# Return the columns of the metadata that are compared, with their sdtype
+def get_compared_columns(metadata, data):
+    return {column: info['sdtype'] for column, info in metadata['columns'].items()
+            if column in data.columns and info['sdtype'] in CONTINUOUS_SDTYPES + DISCRETE_SDTYPES}
+
+
+# Return the values of a continuous column as floats, the datetimes as nanoseconds and the missing values as NaN
+def get_continuous_values(column, sdtype, column_metadata):
+    if sdtype == 'datetime':
+        dates = pd.to_datetime(column, format=column_metadata.get('datetime_format'), errors='coerce')
+        values = dates.values.astype('datetime64[ns]').astype('int64').astype(float)
+        values[dates.isna().values] = np.nan
+        return values
+    return pd.to_numeric(column, errors='coerce').to_numpy(dtype=float)
+
+
+# Return 1 minus the Kolmogorov-Smirnov statistic of two samples, ignoring the missing values
+def get_ks_complement(real, synthetic):
+    real = np.sort(real[~np.isnan(real)])
+    synthetic = np.sort(synthetic[~np.isnan(synthetic)])
+    if len(real) == 0 or len(synthetic) == 0:
+        return np.nan
+
+    # the largest distance between the two empirical distributions is found at one of the values
+    values = np.concatenate([real, synthetic])
+    real_cdf = np.searchsorted(real, values, side='right') / len(real)
+    synthetic_cdf = np.searchsorted(synthetic, values, side='right') / len(synthetic)
+    return 1 - np.max(np.abs(real_cdf - synthetic_cdf))
+
+
+# Return the codes of the values of a column in the real and synthetic data, shared by both
+def get_codes(real, synthetic, dropna):
+    codes, uniques = pd.factorize(pd.concat([real, synthetic], ignore_index=True), use_na_sentinel=dropna)
+    return codes[:len(real)], codes[len(real):], len(uniques)
+
+
+# Return 1 minus the total variation distance of the frequencies of all the discrete columns at once,
+# the codes of each column are shifted so a single count covers every column
+def get_tv_complements(real_codes, synthetic_codes, cardinalities):
+    offsets = np.concatenate([[0], np.cumsum(cardinalities)[:-1]])
+    size = int(np.sum(cardinalities))
+
+    def get_frequencies(codes):
+        codes = codes + offsets
+        # the missing values (negative codes) are not counted, as in SDMetrics
+        counts = np.bincount(codes[codes >= offsets].ravel(), minlength=size).astype(float)
+        totals = np.add.reduceat(counts, offsets)
+        return counts / np.repeat(np.where(totals > 0, totals, np.nan), cardinalities)
+
+    difference = np.abs(get_frequencies(real_codes) - get_frequencies(synthetic_codes))
+    return 1 - 0.5 * np.add.reduceat(difference, offsets)
+
+
+# Return the bin of each value of a continuous column, the missing values in their own bin
+def discretize(values):
+    present = values[~np.isnan(values)]
+    if len(present) == 0:
+        return np.zeros(len(values), dtype=int)
+    return np.digitize(values, bins=np.histogram_bin_edges(present))
+
+
+# Return 1 minus the total variation distance of the joint frequencies of two discrete columns
+def get_contingency_similarity(real_codes, synthetic_codes, cardinalities):
+    first, second = cardinalities
+    size = first * second
+    real = np.bincount(real_codes[:, 0] * second + real_codes[:, 1], minlength=size) / len(real_codes)
+    synthetic = np.bincount(synthetic_codes[:, 0] * second + synthetic_codes[:, 1], minlength=size) / len(synthetic_codes)
+    return 1 - 0.5 * np.abs(real - synthetic).sum()
+
+
+# Score the shape of every column: KS complement of the continuous columns and TV complement of the discrete ones
+def get_column_shapes(real_data, synthetic_data, metadata, continuous, discrete):
+    rows = []
+    for column in continuous:
+        score = get_ks_complement(continuous[column][0], continuous[column][1])
+        rows.append({'Column': column, 'Metric': 'KSComplement', 'Score': score})
+
+    if discrete:
+        names = list(discrete)
+        codes = [get_codes(real_data[column], synthetic_data[column], dropna=True) for column in names]
+        real_codes = np.column_stack([code[0] for code in codes])
+        synthetic_codes = np.column_stack([code[1] for code in codes])
+        cardinalities = np.array([max(code[2], 1) for code in codes])
+        scores = get_tv_complements(real_codes, synthetic_codes, cardinalities)
+        rows += [{'Column': column, 'Metric': 'TVComplement', 'Score': score} for column, score in zip(names, scores)]
+
+    order = {column: i for i, column in enumerate(real_data.columns)}
+    rows.sort(key=lambda row: order[row['Column']])
+    return pd.DataFrame(rows, columns=['Column', 'Metric', 'Score'])
+
+
+# Score the trend of every pair of columns: the difference of the Pearson correlations of two continuous columns,
+# and the contingency similarity of a pair with a discrete column, whose continuous column is discretized
+def get_column_pair_trends(real_data, synthetic_data, columns, continuous):
+    names = list(columns)
+
+    # the correlations of all the continuous columns at once, each pair ignores the rows with missing values
+    continuous_names = [column for column in names if column in continuous]
+    real_correlations = pd.DataFrame({column: continuous[column][0] for column in continuous_names}).corr()
+    synthetic_correlations = pd.DataFrame({column: continuous[column][1] for column in continuous_names}).corr()
+
+    # the discrete codes of every column, the continuous ones binned separately in each dataset as SDMetrics does
+    codes = {}
+    for column in names:
+        if column in continuous:
+            real_bins, synthetic_bins = discretize(continuous[column][0]), discretize(continuous[column][1])
+            codes[column] = get_codes(pd.Series(real_bins), pd.Series(synthetic_bins), dropna=False)
+        else:
+            codes[column] = get_codes(real_data[column].astype(str), synthetic_data[column].astype(str), dropna=False)
+
+    rows = []
+    for i, column1 in enumerate(names):
+        for column2 in names[i + 1:]:
+            if column1 in continuous and column2 in continuous:
+                real = real_correlations.loc[column1, column2]
+                synthetic = synthetic_correlations.loc[column1, column2]
+                rows.append({'Column 1': column1, 'Column 2': column2, 'Metric': 'CorrelationSimilarity',
+                             'Score': 1 - abs(real - synthetic) / 2, 'Real Correlation': real,
+                             'Synthetic Correlation': synthetic})
+            else:
+                real_codes = np.column_stack([codes[column1][0], codes[column2][0]])
+                synthetic_codes = np.column_stack([codes[column1][1], codes[column2][1]])
+                score = get_contingency_similarity(real_codes, synthetic_codes, (codes[column1][2], codes[column2][2]))
+                rows.append({'Column 1': column1, 'Column 2': column2, 'Metric': 'ContingencySimilarity',
+                             'Score': score, 'Real Correlation': np.nan, 'Synthetic Correlation': np.nan})
+    return pd.DataFrame(rows, columns=['Column 1', 'Column 2', 'Metric', 'Score', 'Real Correlation',
+                                       'Synthetic Correlation'])
+
+
+# Evaluate the synthetic data with the properties of the SDMetrics quality report, computed with NumPy
+# over whole columns. Returns the score, the property scores and the details of each property
+def evaluate_fidelity(real_data, synthetic_data, metadata):
+    columns = get_compared_columns(metadata, real_data)
+    continuous = {column: (get_continuous_values(real_data[column], sdtype, metadata['columns'][column]),
+                           get_continuous_values(synthetic_data[column], sdtype, metadata['columns'][column]))
+                  for column, sdtype in columns.items() if sdtype in CONTINUOUS_SDTYPES}
+    discrete = [column for column, sdtype in columns.items() if sdtype in DISCRETE_SDTYPES]
+
+    column_shapes = get_column_shapes(real_data, synthetic_data, metadata, continuous, discrete)
+    column_pair_trends = get_column_pair_trends(real_data, synthetic_data, columns, continuous)
+
+    # the property scores average the columns and pairs that could be scored, the score averages the properties
+    properties = [{'Property': 'Column Shapes', 'Score': float(np.nanmean(column_shapes['Score']))
+                   if column_shapes['Score'].notna().any() else np.nan},
+                  {'Property': 'Column Pair Trends', 'Score': float(np.nanmean(column_pair_trends['Score']))
+                   if column_pair_trends['Score'].notna().any() else np.nan}]
+    return {
+        'score': float(np.nanmean([prop['Score'] for prop in properties])),
+        'properties': properties,
+        'column_shapes': column_shapes,
+        'column_pair_trends': column_pair_trends,
+    }
+
+
+# Return the Plotly figures of the properties, like the visualizations of the SDMetrics quality report
+def get_fidelity_figures(fidelity):
+    import plotly.express as px
+
+    column_shapes = px.bar(fidelity['column_shapes'], x='Column', y='Score', color='Metric', range_y=[0, 1],
+                           title='Data Quality: Column Shapes (Average Score={:.2f})'.format(
+                               fidelity['properties'][0]['Score']))
+
+    pairs = fidelity['column_pair_trends']
+    columns = list(dict.fromkeys(list(pairs['Column 1']) + list(pairs['Column 2'])))
+    matrix = pd.DataFrame(np.nan, index=columns, columns=columns)
+    for _, pair in pairs.iterrows():
+        matrix.loc[pair['Column 1'], pair['Column 2']] = pair['Score']
+        matrix.loc[pair['Column 2'], pair['Column 1']] = pair['Score']
+    column_pair_trends = px.imshow(matrix, zmin=0, zmax=1, color_continuous_scale='RdYlGn',
+                                   title='Data Quality: Column Pair Trends (Average Score={:.2f})'.format(
+                                       fidelity['properties'][1]['Score']))
+    return [('column_shapes', column_shapes), ('column_pair_trends', column_pair_trends)]
+
+
+# Estimate the scores of the properties on bootstrap samples of the given rows of each dataset. A sample scores
+# lower than all the rows, its columns differ more by chance, so each sample is also scored on its first half and
+# the difference is extrapolated to a sample of infinitely many rows, which scores as the data it is drawn from,
+# assuming it falls with the square root of the rows. The interval of the score is the one of the mean of the
+# samples with the uncertainty of that correction, it narrows with more samples. The samples stop once the interval
+# is narrower than the target width or at the maximum of samples. Returns the mean scores and details of the
+# samples, with the sizes, the correction and the interval of the estimate
+def approximate_fidelity(real_data, synthetic_data, metadata, sample_rows, min_samples, max_samples, target_width,
+                         confidence, seed):
+    from statistics import NormalDist
+
+    # datasets that fit in a sample are scored once on all their rows
+    if max(len(real_data), len(synthetic_data)) <= sample_rows:
+        fidelity = evaluate_fidelity(real_data, synthetic_data, metadata)
+        samples, bias, interval, converged = 1, 0.0, [fidelity['score'], fidelity['score']], True
+    else:
+        rng = np.random.default_rng(seed)
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        # the rows are drawn with replacement, so a sample of n rows scores c / sqrt(n) lower than the data it is
+        # drawn from whatever the size of the data, even n rows of n, and the sample and its half differ by
+        # c / sqrt(n / 2) - c / sqrt(n)
+        bias_factor = 1 / (np.sqrt(2) - 1)
+        results = []
+        halves = []
+        while len(results) < max_samples:
+            real_rows = rng.integers(0, len(real_data), min(sample_rows, len(real_data)))
+            synthetic_rows = rng.integers(0, len(synthetic_data), min(sample_rows, len(synthetic_data)))
+            results.append(evaluate_fidelity(real_data.iloc[real_rows], synthetic_data.iloc[synthetic_rows], metadata))
+            halves.append(evaluate_fidelity(real_data.iloc[real_rows[:len(real_rows) // 2]],
+                                            synthetic_data.iloc[synthetic_rows[:len(synthetic_rows) // 2]], metadata))
+
+            scores = np.array([result['score'] for result in results])
+            differences = scores - np.array([half['score'] for half in halves])
+            bias = float(bias_factor * differences.mean())
+            if len(scores) > 1:
+                bias_error = bias_factor * differences.std(ddof=1) / np.sqrt(len(scores))
+                half_width = z * np.sqrt(scores.var(ddof=1) / len(scores) + bias_error ** 2)
+            else:
+                half_width = np.inf
+            # the scores go from 0 to 1
+            estimate = min(1.0, scores.mean() + bias)
+            interval = [float(max(0.0, estimate - half_width)), float(min(1.0, estimate + half_width))]
+            converged = 2 * half_width <= target_width
+            if len(results) >= min_samples and converged:
+                break
+
+        # the estimate averages the samples for each column and pair, and corrects the score of each property
+        samples = len(results)
+        properties = []
+        for i, prop in enumerate(results[0]['properties']):
+            sample_scores = np.array([result['properties'][i]['Score'] for result in results])
+            half_scores = np.array([half['properties'][i]['Score'] for half in halves])
+            properties.append({'Property': prop['Property'], 'Score': float(
+                min(1.0, np.nanmean(sample_scores) + bias_factor * np.nanmean(sample_scores - half_scores)))})
+        fidelity = {
+            'score': float(estimate),
+            'properties': properties,
+            'column_shapes': pd.concat([result['column_shapes'] for result in results])
+                .groupby(['Column', 'Metric'], sort=False, as_index=False)['Score'].mean(),
+            'column_pair_trends': pd.concat([result['column_pair_trends'] for result in results])
+                .groupby(['Column 1', 'Column 2', 'Metric'], sort=False, as_index=False, dropna=False).mean(),
+        }
+
+    fidelity['approximation'] = {
+        'real_rows': len(real_data),
+        'synthetic_rows': len(synthetic_data),
+        'sample_rows': min(sample_rows, max(len(real_data), len(synthetic_data))),
+        'samples': samples,
+        'bias': bias,
+        'confidence': confidence,
+        'interval': interval,
+        'target_width': target_width,
+        'converged': bool(converged),
+    }
+    return fidelity
@@ -0,0 +1,234 @@
+from app import app, db
+from models import Job, Dataset
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import json
+import os
+import warnings
+import config as C
+
+# process pool of the current web worker, created on first use
+executor = None
+
+
+# Return the process pool of the current worker
+def get_executor():
+    global executor
+    if executor is None:
+        executor = ProcessPoolExecutor(max_workers=app.config['EXECUTOR_MAX_WORKERS'], initializer=init_pool_process)
+    return executor
+
+
+# Drop the database connections inherited from the parent process and limit its threads to its share
+def init_pool_process():
+    from threads import set_thread_limit, get_task_threads
+
+    set_thread_limit(get_task_threads())
+    with app.app_context():
+        db.engine.dispose()
+
+
+# Check if the process with the given pid is still alive
+def process_alive(pid):
+    if pid is None:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+# Store a new job in the database and send it to the process pool
+def submit_job(user_id, dataset_id, params, kind='generate'):
+    job = Job(kind=kind, status='queued', params=json.dumps(params), pid=os.getpid(), created_at=datetime.utcnow(),
+              dataset_id=dataset_id, user_id=user_id)
+    db.session.add(job)
+    db.session.commit()
+
+    enqueue_job(job.id)
+    return job
+
+
+# Send the job with the given id to the process pool
+def enqueue_job(job_id):
+    get_executor().submit(run_job, job_id)
+
+
+# Mark the job as running, only one process can claim a queued job
+def claim_job(job_id):
+    claimed = Job.query.filter_by(id=job_id, status='queued').update(
+        {'status': 'running', 'pid': os.getpid(), 'started_at': datetime.utcnow(), 'attempts': Job.attempts + 1})
+    db.session.commit()
+    return claimed == 1
+
+
+# Run the job with the given id inside a pool process
+def run_job(job_id):
+    warnings.simplefilter(action='ignore', category=FutureWarning)
+
+    with app.app_context():
+        if not claim_job(job_id):
+            return
+
+        job = Job.query.get(job_id)
+        try:
+            JOB_RUNNERS[job.kind](job)
+            job.status = 'finished'
+        except Exception as e:
+            job.status = 'failed'
+            job.error = str(e)
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+
+
+# Fit the synthesizer, or load it from the registry, and save the synthetic data of a generate job
+def run_generate_job(job):
+    from synthesizers import sample_to_csv
+    from registry import get_model_key, load_model
+    from evaluation import remove_evaluations
+    from utils import get_dataset_checksum, get_file_checksum, get_file_signature, get_synthetic_path, \
+        get_synthetic_paths
+
+    params = json.loads(job.params)
+    dataset = Dataset.query.get(job.dataset_id)
+    if dataset is None or not os.path.exists(dataset.path):
+        raise ValueError('The dataset does not exist.')
+
+    # a limit above the size of the dataset is the same model as a full fit
+    if params.get('max_fit_rows') and dataset.row_count is not None and dataset.row_count <= params['max_fit_rows']:
+        params['max_fit_rows'] = None
+        params['fit_sampling'] = None
+
+    # a model fitted on the same content with the same parameters is only sampled again
+    key = get_model_key(get_dataset_checksum(dataset), params)
+    synthesizer, fit_info = load_model(key)
+    if synthesizer is None:
+        synthesizer, fit_info = fit_generate_model(dataset, params, key)
+    job.info = json.dumps(fit_info)
+
+    # the evaluations of the previous synthetic data are no longer valid
+    remove_evaluations(dataset.id)
+
+    # the synthetic file of a previous job with another compression is replaced too
+    for path in get_synthetic_paths(dataset):
+        if os.path.exists(path):
+            os.remove(path)
+
+    # the result file can be downloaded while the batches are being written
+    job.result_path = get_synthetic_path(dataset, params.get('compression'))
+    job.rows_done = 0
+    db.session.commit()
+
+    # record the progress after each batch so the status page can show it
+    def on_batch(rows_done):
+        job.rows_done = rows_done
+        db.session.commit()
+
+    # generate synthetic data with the number of rows specified by the user
+    sample_to_csv(synthesizer, params['rows'], job.result_path, C.SAMPLE_BATCH_ROWS, on_batch,
+                  params.get('seed', C.SAMPLE_SEED), params.get('compression'))
+    job.result_checksum = get_file_checksum(job.result_path)
+    job.result_signature = get_file_signature(job.result_path)
+
+
+# Fit the synthesizer of a generate job on the dataset, or on a sample of it, and save it in the registry
+def fit_generate_model(dataset, params, key):
+    from synthesizers import fit_synthesizer
+    from registry import save_model, get_checkpoint_path
+    from utils import get_dataset_metadata
+
+    metadata = get_dataset_metadata(dataset)
+    synthesizer, fit_data, fit_info = fit_synthesizer(dataset.path, metadata, params, dataset.row_count,
+                                                      get_checkpoint_path(key))
+
+    if fit_info['fit_strategy'] != 'full' and params.get('compare_full_fit'):
+        fit_info.update(compare_full_fit(dataset, params, metadata, fit_data, synthesizer))
+
+    # a fit cut by the time budget is not registered, the next run resumes its checkpoint instead
+    if not fit_info['partial']:
+        save_model(key, synthesizer, fit_info)
+    return synthesizer, fit_info
+
+
+# Fit the same synthesizer on all the rows and compare its quality with the one fitted on the sample
+def compare_full_fit(dataset, params, metadata, fit_data, synthesizer):
+    from sdmetrics.reports.single_table import QualityReport
+    from synthesizers import fit_synthesizer, sample_batch
+    from registry import get_model_key, save_model, get_checkpoint_path
+    from utils import get_dataset_checksum
+
+    full_params = dict(params, max_fit_rows=None, fit_sampling=None)
+    full_key = get_model_key(get_dataset_checksum(dataset), full_params)
+    full_synthesizer, _, full_fit_info = fit_synthesizer(dataset.path, metadata, full_params, dataset.row_count,
+                                                         get_checkpoint_path(full_key))
+    # the full fit is kept, a later run without the limit reuses it
+    if not full_fit_info['partial']:
+        save_model(full_key, full_synthesizer, full_fit_info)
+
+    # both models are scored against the training sample, so the comparison fits in memory
+    scores = {}
+    for name, model in [('quality_sample_fit', synthesizer), ('quality_full_fit', full_synthesizer)]:
+        report = QualityReport()
+        report.generate(fit_data, sample_batch(model, len(fit_data)), metadata.to_dict(), verbose=False)
+        scores[name] = report.get_score()
+    scores['quality_difference'] = scores['quality_full_fit'] - scores['quality_sample_fit']
+    return scores
+
+
+# Fit, sample and score each selected synthesizer of a leaderboard job
+def run_leaderboard_job(job):
+    from leaderboard import run_leaderboard
+    from utils import get_dataset_checksum, get_dataset_metadata_dict
+
+    params = json.loads(job.params)
+    dataset = Dataset.query.get(job.dataset_id)
+    if dataset is None or not os.path.exists(dataset.path):
+        raise ValueError('The dataset does not exist.')
+
+    metadata = get_dataset_metadata_dict(dataset)
+    checksum = get_dataset_checksum(dataset)
+    tasks = [{'path': dataset.path, 'metadata': metadata, 'checksum': checksum, 'row_count': dataset.row_count,
+              'rows': params['rows'], 'params': synthesizer_params}
+             for synthesizer_params in params['synthesizers']]
+
+    job.info = json.dumps({'leaderboard': run_leaderboard(tasks)})
+
+
+# functions that run each kind of job
+JOB_RUNNERS = {
+    'generate': run_generate_job,
+    'leaderboard': run_leaderboard_job,
+}
+
+
+# Check if the job is waiting or running in a process that no longer exists
+def is_stale(job):
+    return job.status in ['queued', 'running'] and not process_alive(job.pid)
+
+
+# Send again to the pool the jobs whose process was recycled or killed
+def recover_jobs():
+    jobs = Job.query.filter(Job.status.in_(['queued', 'running'])).all()
+    for job in jobs:
+        if is_stale(job):
+            recover_job(job)
+
+
+# Move a stale job back to the queue of the current worker
+def recover_job(job):
+    # give up on jobs that keep killing the process that runs them
+    if job.attempts >= C.JOB_MAX_ATTEMPTS:
+        job.status = 'failed'
+        job.error = 'The job was interrupted ' + str(job.attempts) + ' times.'
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        return
+
+    recovered = Job.query.filter_by(id=job.id, status=job.status, pid=job.pid).update(
+        {'status': 'queued', 'pid': os.getpid(), 'started_at': None})
+    db.session.commit()
+    if recovered == 1:
+        enqueue_job(job.id)
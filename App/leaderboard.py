@@ -0,0 +1,59 @@
+from registry import get_model_key, load_model, save_model, get_checkpoint_path
+from synthesizers import fit_synthesizer, sample_batch
+from utils import read_data_file
+from threads import set_thread_limit, get_pool_threads
+from multiprocessing import Pool
+import resource
+import time
+import config as C
+
+
+# Return the peak resident memory of the current process in megabytes
+def get_peak_memory_mb():
+    # ru_maxrss is given in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# Fit, sample and score one synthesizer of the leaderboard
+def benchmark_synthesizer(task):
+    from sdmetrics.reports.single_table import QualityReport
+
+    params = task['params']
+    result = {'synthesizer': params['synthesizer']}
+    # the task runs in a fresh process, the growth over its starting memory belongs to this synthesizer
+    baseline_memory = get_peak_memory_mb()
+    try:
+        # a model fitted before with the same options is reused, its fit time is the one recorded then
+        key = get_model_key(task['checksum'], params)
+        synthesizer, fit_info = load_model(key)
+        result['cached'] = synthesizer is not None
+        if synthesizer is None:
+            synthesizer, _, fit_info = fit_synthesizer(task['path'], task['metadata'], params, task['row_count'],
+                                                       get_checkpoint_path(key))
+            if not fit_info['partial']:
+                save_model(key, synthesizer, fit_info)
+        result['fit_seconds'] = fit_info.get('fit_seconds')
+        result['epochs_run'] = fit_info.get('epochs_run')
+
+        start = time.perf_counter()
+        synthetic_data = sample_batch(synthesizer, task['rows'])
+        result['sample_rows_per_second'] = len(synthetic_data) / (time.perf_counter() - start)
+        result['peak_memory_mb'] = get_peak_memory_mb() - baseline_memory
+
+        report = QualityReport()
+        report.generate(read_data_file(task['path']), synthetic_data, task['metadata'], verbose=False)
+        result['quality'] = report.get_score()
+    except Exception as e:
+        result['error'] = str(e)
+    return result
+
+
+# Benchmark the synthesizers concurrently and return them sorted by quality
+def run_leaderboard(tasks):
+    # each synthesizer gets a new process so the peak memory of one does not hide the others,
+    # the threads of the job are split among them
+    processes = min(len(tasks), C.LEADERBOARD_WORKERS)
+    with Pool(processes=processes, maxtasksperchild=1, initializer=set_thread_limit,
+              initargs=(get_pool_threads(processes),)) as pool:
+        results = pool.map(benchmark_synthesizer, tasks, chunksize=1)
+    return sorted(results, key=lambda result: result.get('quality', -1), reverse=True)
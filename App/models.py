@@ -17,10 +17,86 @@ class User(db.Model,UserMixin):
         return f"User('{self.username}')"
 
 class Dataset(db.Model):
+    # the ids are assigned by the database and never reused, so a new dataset never gets the synthetic data,
+    # models or evaluations of a deleted one, which are named by its id
+    __table_args__ = {'sqlite_autoincrement': True}
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(50), nullable=False)
-    path = db.Column(db.String(50), unique=True, nullable=False)
+    # columnar copy read by the application and the uploaded csv, if it is kept,
+    # the datasets uploaded with the same content point at the same files of their blob
+    path = db.Column(db.String(50), nullable=False)
+    csv_path = db.Column(db.String(200))
+    # sha256 of the file content, shared key of the caches built from the dataset
+    checksum = db.Column(db.String(64))
+    # SDV metadata detected at upload and the size and modification time of the file it was detected on
+    sdv_metadata = db.Column(db.Text)
+    metadata_signature = db.Column(db.String(64))
+    # schema index filled at upload, the generate page is rendered from it without reading the file
+    schema = db.Column(db.Text)
+    row_count = db.Column(db.Integer)
+    file_size = db.Column(db.BigInteger)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+
+    def __repr__(self):
+        return f"dataset('{self.name}', '{self.path}')"
+
+class Blob(db.Model):
+    # sha256 of the uploaded file, the files are named by it
+    checksum = db.Column(db.String(64), primary_key=True)
+    path = db.Column(db.String(200), nullable=False)
+    csv_path = db.Column(db.String(200))
+    # datasets that point at the files, they are removed with the last one
+    refcount = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"blob('{self.checksum}', '{self.refcount}')"
+
+class Upload(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    filename = db.Column(db.String(200), nullable=False)
+    # 'receiving' while the chunks arrive, 'complete' once the client finalized it, then 'finished' or 'failed'
+    status = db.Column(db.String(20), nullable=False, default='receiving')
+    size = db.Column(db.BigInteger, nullable=False)
+    chunk_bytes = db.Column(db.Integer, nullable=False)
+    # chunks acknowledged, the upload resumes from this chunk
+    chunks = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text)
+    # process that checks the chunks as they arrive (the web worker while queued, the pool process while running),
+    # none while the check waits for the next chunk
+    pid = db.Column(db.Integer)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False)
+    # time of the last acknowledged chunk, the upload is given up when no chunk arrives for a while
+    updated_at = db.Column(db.DateTime, nullable=False)
+    dataset_id = db.Column(db.Integer, db.ForeignKey('dataset.id'))
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+
+    def __repr__(self):
+        return f"upload('{self.id}', '{self.filename}', '{self.status}')"
+
+class Job(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False, default='generate')
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    params = db.Column(db.Text, nullable=False)
+    result_path = db.Column(db.String(200))
+    # sha256 of the result file and the size:mtime it had, the evaluations are cached by this checksum
+    result_checksum = db.Column(db.String(64))
+    result_signature = db.Column(db.String(64))
+    # synthetic rows already written to the result file
+    rows_done = db.Column(db.Integer, nullable=False, default=0)
+    # json with information about the run, like the rows and sampling strategy used to fit
+    info = db.Column(db.Text)
+    error = db.Column(db.Text)
+    # process that currently owns the job (the web worker while queued, the pool process while running)
+    pid = db.Column(db.Integer)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    dataset_id = db.Column(db.Integer, db.ForeignKey('dataset.id'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
     def __repr__(self):
-        return f"dataset('{self.name}', '{self.path}')"
\ No newline at end of file
+        return f"job('{self.id}', '{self.kind}', '{self.status}')"
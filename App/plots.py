@@ -0,0 +1,109 @@
+from utils import get_regression_lines
+import threading
+import config as C
+
+# the figures of pyplot belong to the whole process, the threads of a threaded server draw them one at a time
+pyplot_lock = threading.Lock()
+
+# titles of the pair plots that do not draw every point
+SCATTER_TITLES = {
+    'sample': 'Random sample of {} rows of each dataset, the regression lines use all the rows',
+    'hexbin': 'Density of all the rows',
+    'hist2d': 'Density of all the rows',
+}
+
+
+# Make matplotlib render to files, without a display
+def use_file_backend():
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+# Save the distribution plot of each column, the Plotly exporter of the process is reused for all of them
+def render_column_plots(columns, prefix, real_data, synthetic_data):
+    from sdmetrics.visualization import get_column_plot
+
+    for column in columns:
+        plot = get_column_plot(real_data, synthetic_data, column)
+        plot.write_image(prefix + column + '.png')
+
+
+# Return how the points of a pair plot are drawn, every point below the row threshold
+def get_scatter_mode(real_data, synthetic_data):
+    if max(len(real_data), len(synthetic_data)) > C.SCATTER_MAX_ROWS:
+        return C.SCATTER_MODE
+    return 'scatter'
+
+
+# Draw the points of one of the datasets of a pair plot with the given mode
+def draw_pair_points(data, column1, column2, mode, color, cmap, label):
+    import matplotlib.pyplot as plt
+
+    points = data[[column1, column2]]
+    if mode == 'scatter' or mode == 'sample':
+        if mode == 'sample' and len(points) > C.SCATTER_MAX_ROWS:
+            # the same rows on every rendering of the pair
+            points = points.sample(C.SCATTER_MAX_ROWS, random_state=0)
+        plt.scatter(points[column1], points[column2], color=color, alpha=0.5, label=label)
+        return
+
+    # the densities count every row, the legend gets an empty marker of the color
+    points = points.dropna()
+    if mode == 'hexbin':
+        plt.hexbin(points[column1], points[column2], gridsize=C.DENSITY_GRID, cmap=cmap, mincnt=1, alpha=0.5)
+    else:
+        plt.hist2d(points[column1], points[column2], bins=C.DENSITY_GRID, cmap=cmap, cmin=1, alpha=0.5)
+    plt.scatter([], [], color=color, label=label)
+
+
+# Draw the regression line of one of the datasets of a pair plot, fitted on all its rows
+def draw_regression_line(data, column1, column2, line, color):
+    import matplotlib.pyplot as plt
+
+    slope, intercept = line
+    # a straight line only needs its two ends
+    x = [data[column1].min(), data[column1].max()]
+    plt.plot(x, [slope * value + intercept for value in x], color=color)
+
+
+# Save the covariance and the regression plot of each pair of columns, one figure at a time
+def render_pair_plots(column_pairs, prefix, real_data, synthetic_data):
+    mode = get_scatter_mode(real_data, synthetic_data)
+    # the regression lines of all the pairs of the task at once
+    real_lines = get_regression_lines(real_data, column_pairs)
+    synthetic_lines = get_regression_lines(synthetic_data, column_pairs)
+    for column1, column2 in column_pairs:
+        with pyplot_lock:
+            render_pair_plot(real_data, synthetic_data, column1, column2, mode, real_lines[(column1, column2)],
+                             synthetic_lines[(column1, column2)], prefix)
+
+
+# Save the covariance and the regression plot of a pair of columns, the points are drawn once
+# and the regression lines are added to the same figure before saving it again
+def render_pair_plot(real_data, synthetic_data, column1, column2, mode, real_line, synthetic_line, prefix):
+    import matplotlib.pyplot as plt
+
+    plt.figure(figsize=(10, 6))
+    draw_pair_points(real_data, column1, column2, mode, 'blue', 'Blues', 'Real Data')
+    draw_pair_points(synthetic_data, column1, column2, mode, 'red', 'Reds', 'Synthetic Data')
+    if mode != 'scatter':
+        plt.title(SCATTER_TITLES[mode].format(C.SCATTER_MAX_ROWS))
+    plt.xlabel(column1)
+    plt.ylabel(column2)
+    plt.legend()
+    plt.savefig(prefix + column1 + column2 + '.png')
+
+    draw_regression_line(real_data, column1, column2, real_line, 'blue')
+    draw_regression_line(synthetic_data, column1, column2, synthetic_line, 'red')
+    plt.savefig(prefix + column1 + column2 + 'reg' + '.png')
+    plt.close()
+
+
+# Save the given plots of the evaluation page in the process of the request. The page asks for each plot on
+# its own, so the concurrent requests of a threaded server render their plots at the same time
+def render_evaluation_plots(real_data, synthetic_data, columns, column_pairs, prefix):
+    use_file_backend()
+    if columns:
+        render_column_plots(columns, prefix, real_data, synthetic_data)
+    if column_pairs:
+        render_pair_plots(column_pairs, prefix, real_data, synthetic_data)
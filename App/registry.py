@@ -0,0 +1,96 @@
+from app import app
+from collections import OrderedDict
+import cloudpickle
+import hashlib
+import json
+import os
+import config as C
+
+# fitted synthesizers loaded by this process, the most recently used at the end
+memory_cache = OrderedDict()
+
+# generation parameters that change the fitted model, the number of rows only affects the sampling
+MODEL_PARAMS = ['synthesizer', 'enforce_min_max_values', 'enforce_rounding', 'numerical_distributions',
+                'default_distribution', 'epochs', 'max_fit_rows', 'fit_sampling', 'early_stopping', 'patience']
+
+
+# Return the registry key of the model fitted on the dataset with the given parameters
+def get_model_key(checksum, params):
+    key = [checksum] + [params.get(param) for param in MODEL_PARAMS]
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+# Return the path where the model with the given key is saved
+def get_model_path(key):
+    return os.path.join(app.root_path, C.MODEL_PATH + key + '.pkl')
+
+
+# Return the path of the training checkpoint of the model with the given key
+def get_checkpoint_path(key):
+    return os.path.join(app.root_path, C.MODEL_PATH + key + '.ckpt')
+
+
+# Return the fitted synthesizer with the given key and the information saved with it,
+# or (None, None) if it was never saved
+def load_model(key):
+    if key in memory_cache:
+        memory_cache.move_to_end(key)
+        return memory_cache[key]
+
+    path = get_model_path(key)
+    if not os.path.exists(path):
+        return None, None
+
+    with open(path, 'rb') as file:
+        model = cloudpickle.load(file)
+    # the modification time orders the models for the disk eviction
+    os.utime(path)
+    remember_model(key, model['synthesizer'], model['info'])
+    return model['synthesizer'], model['info']
+
+
+# Save the fitted synthesizer and the information about its fit in memory and on disk
+def save_model(key, synthesizer, info=None):
+    path = get_model_path(key)
+    # the directory is only created by build_system, which the gunicorn deployment does not run
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # write to a temporary file so other processes never load a half written model
+    tmp_path = path + '.' + str(os.getpid()) + '.tmp'
+    with open(tmp_path, 'wb') as file:
+        cloudpickle.dump({'synthesizer': synthesizer, 'info': info}, file)
+    os.replace(tmp_path, path)
+
+    remember_model(key, synthesizer, info)
+    evict_models(keep=key)
+
+
+# Keep the synthesizer in the in-memory layer, dropping the least recently used
+def remember_model(key, synthesizer, info=None):
+    memory_cache[key] = (synthesizer, info)
+    memory_cache.move_to_end(key)
+    while len(memory_cache) > C.MODEL_CACHE_ENTRIES:
+        memory_cache.popitem(last=False)
+
+
+# Remove the least recently used models until the registry fits in its disk budget
+def evict_models(keep=None):
+    directory = os.path.join(app.root_path, C.MODEL_PATH)
+    models = []
+    for name in os.listdir(directory):
+        if name.endswith('.pkl'):
+            stat = os.stat(os.path.join(directory, name))
+            models.append((stat.st_mtime, stat.st_size, name))
+
+    total = sum(size for _, size, _ in models)
+    for _, size, name in sorted(models):
+        if total <= C.MODEL_REGISTRY_MAX_BYTES:
+            break
+        if name == str(keep) + '.pkl':
+            continue
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            # already evicted by another process
+            pass
+        memory_cache.pop(name[:-len('.pkl')], None)
+        total -= size
@@ -0,0 +1,311 @@
+from app import app, db
+from models import Upload
+from uploads import check_upload, create_dataset, UploadCheck, UploadError, UploadPending
+from compression import get_compression, get_uncompressed_name
+from utils import get_file_checksum
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import hashlib
+import io
+import os
+import pickle
+import shutil
+import warnings
+import config as C
+
+# process pool of the current web worker that checks the chunked uploads, created on first use
+executor = None
+
+
+# Return the process pool of the current worker that checks the uploads
+def get_upload_executor():
+    from jobs import init_pool_process
+
+    global executor
+    if executor is None:
+        executor = ProcessPoolExecutor(max_workers=C.UPLOAD_WORKERS, initializer=init_pool_process)
+    return executor
+
+
+# Return the directory of the chunks of the upload with the given id
+def get_chunk_dir(upload_id):
+    return os.path.join(app.root_path, C.CHUNK_PATH + str(upload_id))
+
+
+# Return the path of the chunk with the given index of an upload
+def get_chunk_path(upload_id, index):
+    return os.path.join(get_chunk_dir(upload_id), str(index) + '.chunk')
+
+
+# Return the path of the file with the point the check of an upload stopped at
+def get_check_path(upload_id):
+    return os.path.join(get_chunk_dir(upload_id), 'check.pickle')
+
+
+# Return the number of chunks of the upload
+def get_chunk_count(upload):
+    return (upload.size + upload.chunk_bytes - 1) // upload.chunk_bytes
+
+
+# Return the number of bytes the chunk with the given index of the upload must have
+def get_chunk_size(upload, index):
+    return min(upload.chunk_bytes, upload.size - index * upload.chunk_bytes)
+
+
+# Start a chunked upload of the file with the given name and size, its check is sent to the pool with the chunks
+def start_upload(user_id, filename, size):
+    if get_uncompressed_name(filename).split('.')[-1] != 'csv':
+        raise UploadError('The file must be a csv file, it can be compressed with gzip, bz2, xz or zstd.')
+    if size <= 0:
+        raise UploadError('The file is empty.')
+
+    now = datetime.utcnow()
+    upload = Upload(filename=filename, size=size, chunk_bytes=C.UPLOAD_RESUMABLE_CHUNK_BYTES, created_at=now,
+                    updated_at=now, user_id=user_id)
+    db.session.add(upload)
+    db.session.commit()
+
+    os.makedirs(get_chunk_dir(upload.id), exist_ok=True)
+    return upload
+
+
+# Send the check of the upload to the pool, unless it is already queued or running: it goes on from the point it
+# stopped at. A compressed upload is only checked once all its chunks arrived, its decompression cannot stop at
+# a chunk and go on later
+def submit_upload_check(upload):
+    query = Upload.query.filter(Upload.id == upload.id, Upload.pid.is_(None),
+                                Upload.status.in_(['receiving', 'complete']))
+    if get_compression(upload.filename) is not None:
+        query = query.filter(Upload.chunks == get_chunk_count(upload))
+    submitted = query.update({'pid': os.getpid()}, synchronize_session=False)
+    db.session.commit()
+    if submitted == 1:
+        get_upload_executor().submit(run_upload_check, upload.id, os.getpid())
+
+
+# Save the chunk with the given index of the upload, read from the request stream, and acknowledge it.
+# The chunk is written to a temporary file and renamed once its size and checksum are right, so the process
+# that checks the upload only reads complete chunks. Returns the sha256 of the chunk
+def save_chunk(upload, index, stream, checksum=None):
+    if upload.status != 'receiving':
+        raise UploadError('The upload is ' + upload.status + '.')
+    if index >= get_chunk_count(upload):
+        raise UploadError('The file only has ' + str(get_chunk_count(upload)) + ' chunks.')
+
+    path = get_chunk_path(upload.id, index)
+    tmp_path = path + '.' + str(os.getpid()) + '.tmp'
+    sha = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp_path, 'wb') as file:
+            for block in iter(lambda: stream.read(C.UPLOAD_CHUNK_BYTES), b''):
+                size += len(block)
+                if size > upload.chunk_bytes:
+                    raise UploadError('The chunk is larger than ' + str(upload.chunk_bytes) + ' bytes.')
+                sha.update(block)
+                file.write(block)
+        if size != get_chunk_size(upload, index):
+            raise UploadError('The chunk has ' + str(size) + ' bytes but it must have ' + str(get_chunk_size(upload, index)) + '.')
+        if checksum is not None and checksum.lower() != sha.hexdigest():
+            raise UploadError('The checksum of the chunk does not match, send it again.')
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    # only the chunk that follows the acknowledged ones moves the upload forward, a chunk sent twice does not
+    Upload.query.filter_by(id=upload.id, chunks=index, status='receiving').update(
+        {'chunks': index + 1, 'updated_at': datetime.utcnow()})
+    db.session.commit()
+    submit_upload_check(upload)
+    return sha.hexdigest()
+
+
+# Mark the upload as complete once all its chunks are acknowledged, the dataset is stored once its check ends
+def finalize_upload(upload):
+    if upload.status != 'receiving':
+        raise UploadError('The upload is ' + upload.status + '.')
+    if upload.chunks < get_chunk_count(upload):
+        raise UploadError('The upload has ' + str(upload.chunks) + ' of ' + str(get_chunk_count(upload)) + ' chunks.')
+
+    Upload.query.filter_by(id=upload.id, status='receiving').update({'status': 'complete'})
+    db.session.commit()
+    submit_upload_check(upload)
+
+
+# Return the state of the upload, the client resumes it from the next chunk
+def get_upload_status(upload):
+    return {
+        'id': upload.id,
+        'status': upload.status,
+        'size': upload.size,
+        'chunk_bytes': upload.chunk_bytes,
+        'chunks': get_chunk_count(upload),
+        'next_chunk': upload.chunks,
+        'error': upload.error,
+        'dataset_id': upload.dataset_id,
+    }
+
+
+# Binary stream of the acknowledged chunks of an upload in order from the given byte, it raises UploadPending
+# when it reaches the last acknowledged chunk, and ends after the last chunk of the upload
+class ChunkReader(io.RawIOBase):
+    def __init__(self, upload, offset=0):
+        self.upload = upload
+        self.index = offset // upload.chunk_bytes
+        self.offset = offset % upload.chunk_bytes
+        self.file = None
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while True:
+            if self.file is not None:
+                size = self.file.readinto(buffer)
+                if size:
+                    return size
+                self.file.close()
+                self.file = None
+                self.index += 1
+
+            if self.index >= get_chunk_count(self.upload):
+                return 0
+            if self.index >= self.upload.chunks:
+                # the chunks acknowledged since the check started are read before it stops
+                db.session.refresh(self.upload)
+                db.session.commit()
+                if self.index >= self.upload.chunks:
+                    raise UploadPending()
+            self.file = open(get_chunk_path(self.upload.id, self.index), 'rb')
+            self.file.seek(self.offset)
+            self.offset = 0
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+        super().close()
+
+
+# Return the point the check of the upload stopped at, or a new one if it did not start
+def load_upload_check(upload):
+    path = get_check_path(upload.id)
+    if not os.path.exists(path):
+        return UploadCheck()
+    with open(path, 'rb') as file:
+        return pickle.load(file)
+
+
+# Save the point the check of the upload stopped at, a process that goes on with it loads it
+def save_upload_check(upload, check):
+    path = get_check_path(upload.id)
+    tmp_path = path + '.' + str(os.getpid()) + '.tmp'
+    with open(tmp_path, 'wb') as file:
+        pickle.dump(check, file)
+    os.replace(tmp_path, path)
+
+
+# Leave the check of the upload until the client sends the next chunk or finalizes it, unless it did since the
+# check looked. Returns whether it was left, the next chunk sends it to the pool again. A check that stops here
+# was not interrupted, so its attempts start again
+def release_upload(upload):
+    released = Upload.query.filter_by(id=upload.id, pid=os.getpid(), chunks=upload.chunks, status='receiving').update(
+        {'pid': None, 'attempts': 0})
+    db.session.commit()
+    return released == 1
+
+
+# Mark the check of the upload as running in this process, only one process can claim it
+def claim_upload(upload_id, pid):
+    claimed = Upload.query.filter(Upload.id == upload_id, Upload.pid == pid,
+                                  Upload.status.in_(['receiving', 'complete'])).update(
+        {'pid': os.getpid(), 'attempts': Upload.attempts + 1}, synchronize_session=False)
+    db.session.commit()
+    return claimed == 1
+
+
+# Check the chunks of the upload with the given id that arrived inside a pool process, and store the dataset
+# once the last one is checked and the upload is complete. The check stops when it reaches a chunk that did not
+# arrive, so no process waits for the client, and goes on from there when the chunk arrives.
+# The chunks are removed when the upload ends
+def run_upload_check(upload_id, pid):
+    warnings.simplefilter(action='ignore', category=FutureWarning)
+
+    with app.app_context():
+        if not claim_upload(upload_id, pid):
+            return
+
+        upload = db.session.get(Upload, upload_id)
+        csv_path = os.path.join(get_chunk_dir(upload.id), 'upload.csv')
+        try:
+            check = load_upload_check(upload)
+            while True:
+                if check.checksum is None:
+                    with ChunkReader(upload, check.size) as reader:
+                        if check_upload(reader, csv_path, check, get_compression(upload.filename)):
+                            check.checksum = get_file_checksum(csv_path)
+                if check.checksum is not None and upload.status == 'complete':
+                    break
+                save_upload_check(upload, check)
+                if release_upload(upload):
+                    return
+                db.session.refresh(upload)
+
+            upload_info = check.get_info(os.path.getsize(csv_path))
+            dataset = create_dataset(upload.user_id, upload.filename, csv_path, upload_info)
+            upload.status = 'finished'
+            upload.dataset_id = dataset.id
+        except Exception as e:
+            upload.status = 'failed'
+            upload.error = str(e)
+        db.session.commit()
+        shutil.rmtree(get_chunk_dir(upload.id), ignore_errors=True)
+
+
+# Check if the upload is still going on but the process that checks it no longer exists, a check that waits for
+# the next chunk has no process
+def is_stale_upload(upload):
+    from jobs import process_alive
+
+    return upload.status in ['receiving', 'complete'] and upload.pid is not None and not process_alive(upload.pid)
+
+
+# Check if the client stopped sending the chunks of the upload
+def is_expired_upload(upload):
+    return (upload.status == 'receiving' and upload.pid is None and
+            (datetime.utcnow() - upload.updated_at).total_seconds() > C.UPLOAD_EXPIRE_SECONDS)
+
+
+# Give up the upload if no chunk arrived for too long
+def expire_upload(upload):
+    expired = Upload.query.filter_by(id=upload.id, pid=None, chunks=upload.chunks, status='receiving').update(
+        {'status': 'failed', 'error': 'No chunk was received for ' + str(C.UPLOAD_EXPIRE_SECONDS) + ' seconds.'})
+    db.session.commit()
+    if expired == 1:
+        shutil.rmtree(get_chunk_dir(upload.id), ignore_errors=True)
+    db.session.refresh(upload)
+
+
+# Send again to the pool the check of an upload whose process was recycled, it goes on from the point it last
+# stopped at
+def recover_upload(upload):
+    if upload.attempts >= C.JOB_MAX_ATTEMPTS:
+        upload.status = 'failed'
+        upload.error = 'The check of the upload was interrupted ' + str(upload.attempts) + ' times.'
+        db.session.commit()
+        shutil.rmtree(get_chunk_dir(upload.id), ignore_errors=True)
+        return
+
+    recovered = Upload.query.filter_by(id=upload.id, pid=upload.pid).update({'pid': os.getpid()})
+    db.session.commit()
+    if recovered == 1:
+        get_upload_executor().submit(run_upload_check, upload.id, os.getpid())
+
+
+# Send again to the pool the checks of all the stale uploads, and give up the expired ones
+def recover_uploads():
+    for upload in Upload.query.filter(Upload.status.in_(['receiving', 'complete'])).all():
+        if is_stale_upload(upload):
+            recover_upload(upload)
+        elif is_expired_upload(upload):
+            expire_upload(upload)
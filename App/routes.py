@@ -1,19 +1,24 @@
-from flask import render_template, url_for, request, redirect
+from flask import render_template, url_for, request, redirect, jsonify, send_file
 from app import app, db
-from models import User, Dataset
+from models import User, Dataset, Job
 from forms import Register, Login
-from utils import build_system, load_dataset, authenticate_user, has_header, separate_with_comma
+from utils import build_system, load_dataset, load_job, load_upload, authenticate_user, get_generation_params, \
+    get_dataset_metadata_dict, read_dataset, remove_dataset_files, \
+    get_dataset_schema, get_dataset_columns, read_data_file, get_dataset_checksum, \
+    get_evaluation_statistics, find_synthetic_path
+from jobs import submit_job, is_stale, recover_job
+from synthesizers import SYNTHESIZERS
+from threads import get_thread_allocation
+from uploads import validate_upload, create_dataset, UploadError
+from resumable import start_upload, save_chunk, finalize_upload, get_upload_status, is_stale_upload, recover_upload, \
+    is_expired_upload, expire_upload
+from compression import get_compression, get_uncompressed_name, MIMETYPES
+from evaluation import get_synthetic_checksum, get_evaluation_key, get_evaluation_file, load_evaluation, \
+    save_evaluation, render_evaluation_files, EVALUATION_MODES
 from flask_login import login_user, login_required, logout_user, current_user
-import pandas as pd
-import numpy as np
 import os
-import warnings
-import matplotlib.pyplot as plt
-from sdv.lite import SingleTablePreset
-from sdv.metadata import SingleTableMetadata
-from sdv.single_table import GaussianCopulaSynthesizer, CTGANSynthesizer, CopulaGANSynthesizer, TVAESynthesizer
-from sdmetrics.reports.single_table import QualityReport
-from sdmetrics.visualization import get_column_plot
+import json
+import uuid
 import config as C
 
 @app.route('/', methods=['POST', 'GET'])
@@ -71,24 +76,27 @@ def register():
 def generate():
     # get the references to the datasets of the user
     datasets = Dataset.query.filter_by(user_id=current_user.id).all()
-    # list to store the datasets as pandas dataframes objects
-    datasets_objs = []
+    # list to store the indexed columns of the datasets, the files are not read
+    datasets_columns = []
     for dataset in datasets:
-        datasets_objs.append(pd.read_csv(dataset.path))
-    return render_template('generate.html',user=current_user, datasets=datasets, datasets_objs=datasets_objs)
+        datasets_columns.append(get_dataset_columns(dataset))
+    return render_template('generate.html',user=current_user, datasets=datasets, datasets_columns=datasets_columns, C_SYNTHETIC_COMPRESSION=C.SYNTHETIC_COMPRESSION)
 
 @app.route('/generate/<id>', methods=['POST', 'GET'])
 @login_required
 def generate_id(id):
     if request.method == 'POST':
-        warnings.simplefilter(action='ignore', category=FutureWarning)
-
         # check if the number of rows and epochs are greater than 0
         if int(request.form['rows_' + str(id)]) <= 0 or int(request.form['epochs_' + str(id)]) <= 0:
             return render_template('error.html', user=current_user, error='The number of rows and epochs must be greater than 0')
 
-        # dictionary to parse the yes/no values from the form
-        yes_no_parser = {'Yes': True, 'No': False}
+        # check if the number of rows used to fit is greater than 0
+        if request.form.get('max_fit_rows_' + str(id)) and int(request.form['max_fit_rows_' + str(id)]) <= 0:
+            return render_template('error.html', user=current_user, error='The number of rows used to fit must be greater than 0')
+
+        # check if the seed is not negative
+        if request.form.get('seed_' + str(id)) and int(request.form['seed_' + str(id)]) < 0:
+            return render_template('error.html', user=current_user, error='The seed must be 0 or greater')
 
         # load the dataset
         dataset = load_dataset(id)
@@ -96,132 +104,136 @@ def generate_id(id):
         if dataset is None or dataset.user_id != current_user.id or not os.path.exists(dataset.path):
             # redirect to the generate page if the dataset does not exist or does not belong to the user
             return redirect(url_for('generate'))
-        real_data = pd.read_csv(dataset.path)
-
-        v_metadata = SingleTableMetadata()
-        v_metadata.detect_from_dataframe(real_data)
-        synthetic_data = None
-
-        # Fast ML synthesizer
-        if request.form['synthetizer_' + str(id)] == 'fast_ml':
-            synthesizer = SingleTablePreset(v_metadata, name='FAST_ML')
-            synthesizer.fit(real_data)
-            synthetic_data = synthesizer.sample(int(request.form['rows_' + str(id)]))
-
-        # CopulaGAN synthesizer
-        elif request.form['synthetizer_' + str(id)] == 'copulagan':
-            v_enforce_min_max = yes_no_parser[request.form['enforce_min_max_values_' + str(id)]]
-
-            v_enforce_rounding = yes_no_parser[request.form['enforce_rounding_' + str(id)]]
-
-            v_epochs = int(request.form['epochs_' + str(id)])
-
-            columns_distribution = {}
-
-            v_cuda = yes_no_parser[request.form['cuda_' + str(id)]]
-
-            for column in real_data.columns:
-                if request.form[column + '_' + str(id)] != 'none':
-                    columns_distribution[column] = request.form[column + '_' + str(id)]
 
-            if not columns_distribution:
-                columns_distribution = None
-
-            v_default_distribution = request.form['default_distribution_' + str(id)]
-
-            synthesizer = CopulaGANSynthesizer(
-                metadata=v_metadata,
-                enforce_min_max_values=v_enforce_min_max,
-                enforce_rounding=v_enforce_rounding,
-                numerical_distributions=columns_distribution,
-                default_distribution=v_default_distribution,
-                epochs=v_epochs,
-                verbose=True,
-                cuda=v_cuda)
-
-            synthesizer.fit(real_data)
-            synthetic_data = synthesizer.sample(int(request.form['rows_' + str(id)]))
-
-        # CTGAN synthesizer
-        elif request.form['synthetizer_' + str(id)] == 'ctgan':
-            v_enforce_min_max = yes_no_parser[request.form['enforce_min_max_values_' + str(id)]]
-
-            v_enforce_rounding = yes_no_parser[request.form['enforce_rounding_' + str(id)]]
-
-            v_epochs = int(request.form['epochs_' + str(id)])
+        if request.form['synthetizer_' + str(id)] not in SYNTHESIZERS:
+            return render_template('error.html', user=current_user, error='Invalid synthetizer')
 
-            v_cuda = yes_no_parser[request.form['cuda_' + str(id)]]
+        # the columns come from the schema index, the dataset is loaded by the job
+        columns = [column['name'] for column in get_dataset_schema(dataset)]
+        params = get_generation_params(request.form, id, columns)
 
-            synthesizer = CTGANSynthesizer(
-                metadata=v_metadata,
-                enforce_min_max_values=v_enforce_min_max,
-                enforce_rounding=v_enforce_rounding,
-                epochs=v_epochs,
-                verbose=True,
-                cuda=v_cuda
-            )
+        # send the fit and sample work to the process pool and return at once
+        job = submit_job(current_user.id, dataset.id, params)
+        return redirect(url_for('job_page', job_id=job.id))
+    else:
+        return redirect(url_for('generate'))
 
-            synthesizer.fit(real_data)
-            synthetic_data = synthesizer.sample(int(request.form['rows_' + str(id)]))
 
-        # Gaussian Copula synthesizer
-        elif request.form['synthetizer_' + str(id)] == 'gaussian_copula':
-            v_enforce_min_max = yes_no_parser[request.form['enforce_min_max_values_' + str(id)]]
+@app.route('/leaderboard/<id>', methods=['POST', 'GET'])
+@login_required
+def leaderboard(id):
+    if request.method == 'POST':
+        # check if the number of rows and epochs are greater than 0
+        if int(request.form['rows_' + str(id)]) <= 0 or int(request.form['epochs_' + str(id)]) <= 0:
+            return render_template('error.html', user=current_user, error='The number of rows and epochs must be greater than 0')
 
-            v_enforce_rounding = yes_no_parser[request.form['enforce_rounding_' + str(id)]]
+        # load the dataset
+        dataset = load_dataset(id)
+        # check if the dataset exists and if it belongs to the user
+        if dataset is None or dataset.user_id != current_user.id or not os.path.exists(dataset.path):
+            return redirect(url_for('generate'))
 
-            columns_distribution = {}
+        selected = [name for name in SYNTHESIZERS if request.form.get('compare_' + name + '_' + str(id)) == 'Yes']
+        if not selected:
+            return render_template('error.html', user=current_user, error='Select at least one synthetizer to compare')
+
+        # the options of the form are shared by all the selected synthesizers
+        columns = [column['name'] for column in get_dataset_schema(dataset)]
+        synthesizers_params = []
+        for name in selected:
+            form = request.form.to_dict()
+            form['synthetizer_' + str(id)] = name
+            synthesizers_params.append(get_generation_params(form, id, columns))
+
+        params = {'rows': int(request.form['rows_' + str(id)]), 'synthesizers': synthesizers_params}
+        job = submit_job(current_user.id, dataset.id, params, kind='leaderboard')
+        return redirect(url_for('job_page', job_id=job.id))
+    else:
+        return redirect(url_for('generate'))
 
-            for column in real_data.columns:
-                if request.form[column + '_' + str(id)] != 'none':
-                    columns_distribution[column] = request.form[column + '_' + str(id)]
 
-            if not columns_distribution:
-                columns_distribution = None
+@app.route('/job/<job_id>', methods=['GET'])
+@login_required
+def job_page(job_id):
+    job = load_job(job_id)
+    # check if the job exists and if it belongs to the user
+    if job is None or job.user_id != current_user.id:
+        return redirect(url_for('generate'))
 
-            v_default_distribution = request.form['default_distribution_' + str(id)]
+    # send the job again to the pool if its worker was recycled
+    if is_stale(job):
+        recover_job(job)
 
-            synthesizer = GaussianCopulaSynthesizer(
-                metadata=v_metadata,
-                enforce_min_max_values=v_enforce_min_max,
-                enforce_rounding=v_enforce_rounding,
-                numerical_distributions=columns_distribution,
-                default_distribution=v_default_distribution
-            )
-            synthesizer.fit(real_data)
-            synthetic_data = synthesizer.sample(int(request.form['rows_' + str(id)]))
+    if job.status == 'finished':
+        return redirect(url_for('job_result', job_id=job.id))
+    if job.status == 'failed':
+        return render_template('error.html', user=current_user, error=job.error)
 
-        # TVAE synthesizer
-        elif request.form['synthetizer_' + str(id)] == 'tvae':
-            v_enforce_min_max = yes_no_parser[request.form['enforce_min_max_values_' + str(id)]]
+    # once the first batch is written the partial file can be previewed and downloaded
+    synthetic_data = None
+    if job.rows_done > 0 and os.path.exists(job.result_path):
+        synthetic_data = read_data_file(job.result_path, nrows=5)
+    return render_template('job.html', user=current_user, job=job, rows=json.loads(job.params).get('rows'),
+                           synthetic_data=synthetic_data)
 
-            v_enforce_rounding = yes_no_parser[request.form['enforce_rounding_' + str(id)]]
 
-            v_epochs = int(request.form['epochs_' + str(id)])
+@app.route('/job_status/<job_id>', methods=['GET'])
+@login_required
+def job_status(job_id):
+    job = load_job(job_id)
+    # check if the job exists and if it belongs to the user
+    if job is None or job.user_id != current_user.id:
+        return jsonify({'error': 'Job not found'}), 404
+
+    if is_stale(job):
+        recover_job(job)
+
+    return jsonify({
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'error': job.error,
+        'rows_done': job.rows_done,
+        'dataset_id': job.dataset_id,
+        'created_at': job.created_at.isoformat(),
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'result_url': url_for('job_result', job_id=job.id) if job.status == 'finished' else None,
+    })
+
+
+@app.route('/threads', methods=['GET'])
+@login_required
+def thread_allocation():
+    # show how the cores are split among the concurrent tasks
+    running_jobs = Job.query.filter_by(status='running').all()
+    return jsonify(get_thread_allocation(running_jobs))
 
-            v_cuda = yes_no_parser[request.form['cuda_' + str(id)]]
 
-            synthesizer = TVAESynthesizer(
-                metadata=v_metadata,
-                enforce_min_max_values=v_enforce_min_max,
-                enforce_rounding=v_enforce_rounding,
-                epochs=v_epochs,
-                cuda=v_cuda
-            )
+@app.route('/result/<job_id>', methods=['GET'])
+@login_required
+def job_result(job_id):
+    job = load_job(job_id)
+    # check if the job exists, if it belongs to the user and if it has finished
+    if job is None or job.user_id != current_user.id:
+        return redirect(url_for('generate'))
+    if job.status != 'finished':
+        return redirect(url_for('job_page', job_id=job.id))
 
-            # train the synthesizer with the real data
-            synthesizer.fit(real_data)
-            # generate synthetic data with the number of rows specified by the user
-            synthetic_data = synthesizer.sample(int(request.form['rows_' + str(id)]))
-        else:
-            return render_template('error.html', user=current_user, error='Invalid synthetizer')
+    dataset = load_dataset(job.dataset_id)
+    if job.kind == 'leaderboard':
+        return render_template('leaderboard.html', user=current_user, job=job, file_name=dataset.name if dataset else '',
+                               leaderboard=json.loads(job.info)['leaderboard'])
 
-        # save the synthetic data to a csv file
-        synthetic_data.to_csv(os.path.join(app.root_path,C.SYNTHETIC_PATH + str(id) + '_s_' + dataset.name), index=False)
-        return render_template('showdata.html', id=id, user=current_user ,file_name=dataset.name, real_data=real_data, synthetic_data=synthetic_data, C_SYNTHETIC_PATH=C.SYNTHETIC_PATH, C_PLOT_PATH=C.PLOT_PATH)
-    else:
+    if dataset is None or not os.path.exists(dataset.path) or not os.path.exists(job.result_path):
         return redirect(url_for('generate'))
 
+    # only the first rows are shown in the preview
+    real_data = read_dataset(dataset, nrows=5)
+    synthetic_data = read_data_file(job.result_path, nrows=5)
+    fit_info = json.loads(job.info) if job.info else None
+    return render_template('showdata.html', id=str(dataset.id), user=current_user ,file_name=dataset.name, real_data=real_data, synthetic_data=synthetic_data, fit_info=fit_info, C_PLOT_PATH=C.PLOT_PATH, C_EVALUATION_MODE=C.EVALUATION_MODE)
+
 
 @app.route('/upload', methods=['POST', 'GET'])
 @login_required
@@ -237,46 +249,96 @@ def upload():
         if file.filename == '':
             return render_template('error.html', user=current_user, error='No selected file.')
 
-        # check if the file is a csv file
-        if file.filename.split('.')[-1] != 'csv':
-            return render_template('error.html', user=current_user, error='The file must be a csv file.')
+        # check if the file is a csv file, it can be compressed
+        csv_name = get_uncompressed_name(file.filename)
+        if csv_name.split('.')[-1] != 'csv':
+            return render_template('error.html', user=current_user, error='The file must be a csv file, it can be compressed with gzip, bz2, xz or zstd.')
+
+        # save the file in a single pass that decompresses it and checks the headers and every row,
+        # stopping at the first bad line. The id of the dataset is assigned when it is stored, so the file
+        # gets a unique name of its own and the uploads of several workers never write the same file
+        csv_path = os.path.join(app.root_path, C.DATASET_PATH + uuid.uuid4().hex + '_' + csv_name)
+        try:
+            upload_info = validate_upload(file.stream, csv_path, get_compression(file.filename))
+            create_dataset(current_user.id, file.filename, csv_path, upload_info)
+        except UploadError as e:
+            return render_template('error.html', user=current_user, error=str(e))
 
-        # check if the csv uploaded has headers
-        if not has_header(file):
-            return render_template('error.html', user=current_user, error='The file must have headers.')
+        return redirect(url_for('generate'))
 
-        # check if the csv uploaded is separated by commas
-        if not separate_with_comma(file):
-            return render_template('error.html', user=current_user, error='The file must be separated by commas.')
+    else:
+        return render_template('upload.html', user=current_user, C_UPLOAD_RESUMABLE_MIN_BYTES=C.UPLOAD_RESUMABLE_MIN_BYTES)
 
-        # check if the headers contain special characters
-        header_line = file.readline().decode('utf-8').strip()
-        if not all(c.isalnum() or c == '.' or c == '-' or c == ':' or c == ',' or c == '_' for c in header_line):
-            return render_template('error.html', user=current_user,
-                                   error='The headers must not contain special characters.')
+@app.route('/upload/init', methods=['POST'])
+@login_required
+def upload_init():
+    # a large file is sent in chunks: the client starts the upload with the name and size of the file
+    try:
+        upload = start_upload(current_user.id, request.form.get('filename', ''), request.form.get('size', 0, type=int))
+    except UploadError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(get_upload_status(upload)), 201
+
+
+# Return the chunked upload with the given id if it belongs to the user, sending its check again to the pool
+# if its process was recycled, and giving it up if the client stopped sending its chunks
+def load_user_upload(upload_id):
+    upload = load_upload(upload_id)
+    if upload is None or upload.user_id != current_user.id:
+        return None
+    if is_stale_upload(upload):
+        recover_upload(upload)
+    elif is_expired_upload(upload):
+        expire_upload(upload)
+    return upload
+
+
+@app.route('/upload/<int:upload_id>', methods=['GET'])
+@login_required
+def upload_status(upload_id):
+    upload = load_user_upload(upload_id)
+    if upload is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    return jsonify(get_upload_status(upload))
 
-        # position the file pointer at the beginning of the file
-        file.seek(0)
 
-        # get the last dataset id
-        last_dataset = db.session.query(Dataset).order_by(Dataset.id.desc()).first()
+@app.route('/upload/<int:upload_id>/<int:index>', methods=['PUT'])
+@login_required
+def upload_chunk(upload_id, index):
+    upload = load_user_upload(upload_id)
+    if upload is None:
+        return jsonify({'error': 'Upload not found'}), 404
 
-        # Check if a dataset was returned
-        if last_dataset is not None:
-            id = last_dataset.id + 1
-        else:
-            id = 1
+    # a failed upload stops at once with the first bad line, a chunk after the next one is sent again from it
+    if upload.status != 'receiving' or index > upload.chunks:
+        return jsonify(get_upload_status(upload)), 409
 
-        # save the file
-        file.save(os.path.join(app.root_path, C.DATASET_PATH + str(id) + '_' + file.filename))
-        dataset = Dataset(id=id, name=file.filename, path=os.path.join(app.root_path, C.DATASET_PATH + str(id) + '_' + file.filename), user_id=current_user.id)
-        db.session.add(dataset)
-        db.session.commit()
+    # a chunk already acknowledged is not written again
+    if index < upload.chunks:
+        return jsonify(get_upload_status(upload))
 
-        return redirect(url_for('generate'))
+    try:
+        checksum = save_chunk(upload, index, request.stream, request.headers.get('X-Chunk-SHA256'))
+    except UploadError as e:
+        return jsonify(dict(get_upload_status(upload), error=str(e))), 400
+    db.session.refresh(upload)
+    return jsonify(dict(get_upload_status(upload), sha256=checksum))
 
-    else:
-        return render_template('upload.html', user=current_user)
+
+@app.route('/upload/<int:upload_id>/finalize', methods=['POST'])
+@login_required
+def upload_finalize(upload_id):
+    upload = load_user_upload(upload_id)
+    if upload is None:
+        return jsonify({'error': 'Upload not found'}), 404
+
+    # the last rows are checked and the dataset is stored in the pool, the client follows the status
+    try:
+        finalize_upload(upload)
+    except UploadError as e:
+        return jsonify(dict(get_upload_status(upload), error=upload.error or str(e))), 409
+    db.session.refresh(upload)
+    return jsonify(get_upload_status(upload)), 202
 
 @app.route('/delete/<id>', methods=['POST', 'GET'])
 @login_required
@@ -292,44 +354,104 @@ def delete(id):
         db.session.delete(dataset)
         db.session.commit()
 
-        # delete the file
-        os.remove(dataset.path)
+        # delete the files
+        remove_dataset_files(dataset)
         return redirect(url_for('generate'))
     else:
         return redirect(url_for('generate'))
 
+@app.route('/download/<id>', methods=['GET'])
+@login_required
+def download(id):
+    # check if the dataset exists, if it belongs to the user and if it has synthetic data
+    dataset = load_dataset(id)
+    synthetic_path = find_synthetic_path(dataset) if dataset else None
+    if dataset is None or dataset.user_id != current_user.id or synthetic_path is None:
+        return render_template('error.html', user=current_user, error='The synthetic dataset does not exist.'), 404
+
+    # sent as an attachment of the type of its compression, so the browsers keep the compressed file as it is
+    return send_file(synthetic_path, mimetype=MIMETYPES.get(get_compression(synthetic_path), 'text/csv'), as_attachment=True)
+
 @app.route('/evaluate/<id>', methods=['POST', 'GET'])
 @login_required
 def evaluate(id):
-    from utils import get_regression_line
-
     # check if the dataset exists and if it belongs to the user
     dataset = load_dataset(id)
-    if dataset is None or dataset.user_id != current_user.id or not os.path.exists(dataset.path) or not os.path.exists(os.path.join(app.root_path,C.SYNTHETIC_PATH + str(id) + '_s_' + dataset.name)):
+    synthetic_path = find_synthetic_path(dataset) if dataset else None
+    if dataset is None or dataset.user_id != current_user.id or not os.path.exists(dataset.path) or synthetic_path is None:
         return redirect(url_for('generate'))
 
-    # load the real and synthetic data as pandas dataframes
-    real_data = pd.read_csv(dataset.path)
-    synthetic_data = pd.read_csv(os.path.join(app.root_path,C.SYNTHETIC_PATH + str(id) + '_s_' + dataset.name))
-    metadata = SingleTableMetadata()
-    metadata.detect_from_dataframe(real_data)
+    # the synthetic file is only complete once the generate job has finished
+    pending_job = Job.query.filter(Job.dataset_id == dataset.id, Job.status.in_(['queued', 'running'])).first()
+    if pending_job is not None:
+        return redirect(url_for('job_page', job_id=pending_job.id))
+
+    # the full SDMetrics quality report or the fast evaluation of the same properties
+    mode = request.values.get('mode', C.EVALUATION_MODE)
+    if mode not in EVALUATION_MODES:
+        return render_template('error.html', user=current_user, error='The evaluation mode does not exist.'), 400
+
+    # the report, the statistics of the page and the plots are computed once for each pair of real and synthetic files
+    key = get_evaluation_key(get_dataset_checksum(dataset), get_synthetic_checksum(dataset, synthetic_path))
+    evaluation = load_evaluation(dataset.id, key, mode)
+    # evaluations stored before the figures of the report and the statistics were kept with them are computed again
+    if evaluation is None or 'figures' not in evaluation or 'statistics' not in evaluation:
+        # load the real and synthetic data as pandas dataframes, only when the evaluation is computed
+        real_data = read_dataset(dataset)
+        synthetic_data = read_data_file(synthetic_path)
+        evaluation = save_evaluation(dataset.id, key, lambda directory: compute_evaluation(
+            dataset, real_data, synthetic_data, mode), mode)
+
+    return render_template('evaluate.html',user=current_user,file_name=dataset.name,id=id,score=evaluation['score'],properties=evaluation['properties'],statistics=evaluation['statistics'], column_pairs=evaluation['column_pairs'], mode=mode, modes=EVALUATION_MODES, approximation=evaluation.get('approximation'), figures=evaluation['figures'])
+
+
+# Return the score, the property scores and the figures of the properties with the SDMetrics quality report
+def get_quality_report(real_data, synthetic_data, metadata):
+    from sdmetrics.reports.single_table import QualityReport
 
-    # Generate the quality report
     report = QualityReport()
-    report.generate(real_data, synthetic_data,metadata.to_dict())
+    report.generate(real_data, synthetic_data, metadata)
+    return {
+        'score': report.get_score(),
+        'properties': report.get_properties().to_dict(orient='records'),
+        'figures': [('column_shapes', report.get_visualization(property_name='Column Shapes')),
+                    ('column_pair_trends', report.get_visualization(property_name='Column Pair Trends'))],
+    }
+
+
+# Return the score, the property scores and the figures of the properties with the fast evaluation
+def get_fast_report(real_data, synthetic_data, metadata):
+    from fidelity import evaluate_fidelity, get_fidelity_figures
+
+    fidelity = evaluate_fidelity(real_data, synthetic_data, metadata)
+    return {'score': fidelity['score'], 'properties': fidelity['properties'], 'figures': get_fidelity_figures(fidelity)}
+
+
+# Return the estimated score, property scores and figures of the properties on bootstrap samples of the rows,
+# with the sizes and the confidence interval of the estimate
+def get_approximate_report(real_data, synthetic_data, metadata):
+    from fidelity import approximate_fidelity, get_fidelity_figures
+
+    fidelity = approximate_fidelity(real_data, synthetic_data, metadata, C.APPROXIMATE_SAMPLE_ROWS,
+                                    C.APPROXIMATE_MIN_SAMPLES, C.APPROXIMATE_MAX_SAMPLES,
+                                    C.APPROXIMATE_TARGET_WIDTH, C.APPROXIMATE_CONFIDENCE, C.APPROXIMATE_SEED)
+    return {'score': fidelity['score'], 'properties': fidelity['properties'], 'figures': get_fidelity_figures(fidelity),
+            'approximation': fidelity['approximation']}
 
-    # Save the plot of columns similarities
-    column_fig = report.get_visualization(property_name='Column Shapes')
-    column_fig.write_image(os.path.join(app.root_path,C.PLOT_PATH + str(id) + 'column_shapes.png'))
 
-    # Save the plot of columns pairs trends
-    pair_fig = report.get_visualization(property_name='Column Pair Trends')
-    pair_fig.write_image(os.path.join(app.root_path, C.PLOT_PATH + str(id) + 'column_pair_trends.png'))
+EVALUATION_REPORTS = {
+    'full': get_quality_report,
+    'fast': get_fast_report,
+    'approximate': get_approximate_report,
+}
 
-    # Save the plot of columns distributions
-    for column in real_data.columns:
-        plot = get_column_plot(real_data, synthetic_data, column)
-        plot.write_image(os.path.join(app.root_path,C.PLOT_PATH + str(id) + column + '.png'))
+
+# Evaluate the synthetic data with the given mode
+def compute_evaluation(dataset, real_data, synthetic_data, mode='full'):
+    metadata = get_dataset_metadata_dict(dataset, real_data)
+
+    # Generate the quality report
+    report = EVALUATION_REPORTS[mode](real_data, synthetic_data, metadata)
 
     # Save the pairs of numerical columns
     num_columns = len(real_data.columns)
@@ -339,33 +461,45 @@ def evaluate(id):
                     if real_data[real_data.columns[i]].dtype in ['int64', 'float64'] and
                     real_data[real_data.columns[j]].dtype in ['int64', 'float64']]
 
-    # pair plots covariance
-    for column1, column2 in column_pairs:
-        plt.figure(figsize=(10, 6))
-        plt.scatter(real_data[column1], real_data[column2], color='blue', alpha=0.5, label='Real Data')
-        plt.scatter(synthetic_data[column1], synthetic_data[column2], color='red', alpha=0.5, label='Synthetic Data')
-        plt.xlabel(column1)
-        plt.ylabel(column2)
-        plt.legend()
-        plt.savefig(os.path.join(app.root_path, C.PLOT_PATH + str(id) + column1 + column2 + '.png'))
-        plt.close()
-
-    # pair plots regression
-    for column1, column2 in column_pairs:
-        plt.figure(figsize=(10, 6))
-        plt.scatter(real_data[column1], real_data[column2], color='blue', alpha=0.5, label='Real Data')
-        plt.scatter(synthetic_data[column1], synthetic_data[column2], color='red', alpha=0.5, label='Synthetic Data')
-        slope, intercept = get_regression_line(real_data[column1], real_data[column2])
-        plt.plot(real_data[column1], slope * real_data[column1] + intercept, color='blue')
-        slope, intercept = get_regression_line(synthetic_data[column1], synthetic_data[column2])
-        plt.plot(synthetic_data[column1], slope * synthetic_data[column1] + intercept, color='red')
-        plt.xlabel(column1)
-        plt.ylabel(column2)
-        plt.legend()
-        plt.savefig(os.path.join(app.root_path,C.PLOT_PATH + str(id) + column1 + column2 + 'reg' + '.png'))
-        plt.close()
-
-    return render_template('evaluate.html',user=current_user,file_name=dataset.name,id=id,score=report.get_score(),real_data=real_data,synthetic_data=synthetic_data, column_pairs=column_pairs, C_PLOT_PATH=C.PLOT_PATH, C_SYNTHETIC_PATH=C.SYNTHETIC_PATH)
+    # Save the figures of the report as Plotly JSON, drawn by the browser instead of exported to images.
+    # The plots of each column and pair are rendered when the page shows them
+    report['figures'] = {name: json.loads(figure.to_json()) for name, figure in report['figures']}
+
+    # the mode is stored with the result, the approximate one also stores its sample sizes and interval
+    report['mode'] = mode
+    report['column_pairs'] = column_pairs
+    # the statistics and regression lines shown by the page, from the same sums over the rows
+    report['statistics'] = get_evaluation_statistics(real_data, synthetic_data, column_pairs)
+    return report
+
+@app.route('/plot/<id>', methods=['GET'])
+@login_required
+def plot(id):
+    from plots import render_evaluation_plots
+
+    # check if the dataset exists and if it belongs to the user
+    dataset = load_dataset(id)
+    synthetic_path = find_synthetic_path(dataset) if dataset else None
+    if dataset is None or dataset.user_id != current_user.id or not os.path.exists(dataset.path) or synthetic_path is None:
+        return render_template('error.html', user=current_user, error='The dataset does not exist.'), 404
+
+    # the distribution plot of a column, or the covariance or regression plot of a pair of columns
+    columns = [request.args[name] for name in ['column', 'column1', 'column2'] if request.args.get(name)]
+    if len(columns) not in [1, 2] or not set(columns) <= set(column['name'] for column in get_dataset_schema(dataset)):
+        return render_template('error.html', user=current_user, error='The columns do not exist.'), 404
+    name = str(id) + ''.join(columns) + ('reg' if request.args.get('regression') == 'Yes' else '') + '.png'
+
+    # the plot is rendered the first time it is asked for and kept with the evaluation of the same files
+    key = get_evaluation_key(get_dataset_checksum(dataset), get_synthetic_checksum(dataset, synthetic_path))
+    path = get_evaluation_file(dataset.id, key, name)
+    if not os.path.exists(path):
+        real_data = read_dataset(dataset, columns=columns)
+        synthetic_data = read_data_file(synthetic_path, columns=columns)
+        column_pairs = [tuple(columns)] if len(columns) == 2 else []
+        render_evaluation_files(dataset.id, key, lambda directory: render_evaluation_plots(
+            real_data, synthetic_data, columns[:1] if len(columns) == 1 else [], column_pairs,
+            os.path.join(directory, str(id))))
+    return send_file(path, mimetype='image/png')
 
 @app.route('/about', methods=['POST', 'GET'])
 def about():
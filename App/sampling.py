@@ -0,0 +1,97 @@
+from utils import iter_data_batches
+import numpy as np
+import pandas as pd
+import config as C
+
+# random key given to each row, the sample is formed by the rows with the smallest keys
+KEY_COLUMN = '__sample_key'
+STRATUM_COLUMN = '__sample_stratum'
+
+
+# Draw a uniform sample of at most k rows without keeping more than k rows plus one batch in memory
+def reservoir_sample(path, k, seed=C.FIT_SAMPLE_SEED):
+    rng = np.random.default_rng(seed)
+    reservoir = None
+    for batch in iter_data_batches(path):
+        batch[KEY_COLUMN] = rng.random(len(batch))
+        if reservoir is not None:
+            batch = pd.concat([reservoir, batch], ignore_index=True)
+        reservoir = batch.nsmallest(k, KEY_COLUMN)
+
+    return reservoir.drop(columns=KEY_COLUMN).reset_index(drop=True)
+
+
+# Return the stratum of each row, the combination of the values of the given columns
+def get_strata(batch, columns):
+    strata = batch[columns[0]].astype(str)
+    if len(columns) > 1:
+        strata = strata.str.cat([batch[column].astype(str) for column in columns[1:]], sep='\x1f')
+    return strata
+
+
+# Split the k rows among the strata proportionally to their size, with at least one row per stratum
+def allocate_strata(counts, k):
+    total = counts.sum()
+    exact = counts * k / total
+    allocation = np.minimum(np.maximum(np.floor(exact), 1), counts).astype(int)
+
+    # give the remaining rows to the strata with the largest remainders
+    remaining = k - allocation.sum()
+    if remaining > 0:
+        order = (exact - allocation).sort_values(ascending=False).index
+        allocation.loc[order[:remaining]] += 1
+
+    # the small strata raised to one row are paid by the strata furthest above their share
+    while remaining < 0:
+        order = (allocation - exact)[allocation > 1].sort_values(ascending=False).index
+        allocation.loc[order[:-remaining]] -= 1
+        remaining = k - allocation.sum()
+    return allocation
+
+
+# Draw a sample of at most k rows that keeps the proportions of the combinations of the given columns,
+# or return None if there are more strata than rows in the sample
+def stratified_sample(path, k, columns, seed=C.FIT_SAMPLE_SEED):
+    # first pass, count the rows of each stratum reading only the stratification columns
+    counts = None
+    for batch in iter_data_batches(path, columns=columns):
+        batch_counts = get_strata(batch, columns).value_counts()
+        counts = batch_counts if counts is None else counts.add(batch_counts, fill_value=0)
+    counts = counts.astype(int)
+    if len(counts) > k:
+        return None
+    allocation = allocate_strata(counts, k)
+
+    # second pass, keep in each stratum the rows with the smallest random keys
+    rng = np.random.default_rng(seed)
+    sample = None
+    for batch in iter_data_batches(path):
+        batch[KEY_COLUMN] = rng.random(len(batch))
+        batch[STRATUM_COLUMN] = get_strata(batch, columns)
+        if sample is not None:
+            batch = pd.concat([sample, batch], ignore_index=True)
+        batch = batch.sort_values(KEY_COLUMN)
+        rank = batch.groupby(STRATUM_COLUMN, sort=False).cumcount()
+        sample = batch[rank.values < batch[STRATUM_COLUMN].map(allocation).values]
+
+    return sample.drop(columns=[KEY_COLUMN, STRATUM_COLUMN]).reset_index(drop=True)
+
+
+# Return the categorical columns of the metadata, used to stratify the sample
+def get_stratification_columns(metadata):
+    return [column for column, info in metadata['columns'].items() if info['sdtype'] in ['categorical', 'boolean']]
+
+
+# Draw the training sample of the dataset file, returning the sample and the strategy used
+def draw_fit_sample(path, k, strategy, metadata, row_count):
+    if row_count is not None and row_count <= k:
+        return None, 'full'
+
+    if strategy == 'stratified':
+        columns = get_stratification_columns(metadata)
+        sample = stratified_sample(path, k, columns) if columns else None
+        # without categorical columns, or with more strata than rows, the uniform sample is used instead
+        if sample is not None:
+            return sample, 'stratified'
+
+    return reservoir_sample(path, k), 'reservoir'
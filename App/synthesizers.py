@@ -0,0 +1,210 @@
+from threads import set_thread_limit, get_pool_threads
+from utils import read_data_file
+from compression import open_text_file
+from multiprocessing import Pool
+import cloudpickle
+import collections
+import itertools
+import numpy as np
+import random
+import os
+import time
+import config as C
+
+# synthesizers that can be selected in the generate form
+SYNTHESIZERS = ['fast_ml', 'gaussian_copula', 'ctgan', 'copulagan', 'tvae']
+# synthesizers trained by epochs, with early stopping and checkpoints
+EPOCH_SYNTHESIZERS = ['ctgan', 'copulagan', 'tvae']
+
+# synthesizer of a sampling process, received once when the process starts
+process_synthesizer = None
+
+
+# Build the synthesizer described by the generation parameters
+def build_synthesizer(params, metadata):
+    # SDV loads torch, it is only imported by the processes that fit
+    from sdv.lite import SingleTablePreset
+    from sdv.single_table import GaussianCopulaSynthesizer, CTGANSynthesizer, CopulaGANSynthesizer, TVAESynthesizer
+
+    # Fast ML synthesizer
+    if params['synthesizer'] == 'fast_ml':
+        return SingleTablePreset(metadata, name='FAST_ML')
+
+    # CopulaGAN synthesizer
+    elif params['synthesizer'] == 'copulagan':
+        return CopulaGANSynthesizer(
+            metadata=metadata,
+            enforce_min_max_values=params['enforce_min_max_values'],
+            enforce_rounding=params['enforce_rounding'],
+            numerical_distributions=params['numerical_distributions'],
+            default_distribution=params['default_distribution'],
+            epochs=params['epochs'],
+            verbose=True,
+            cuda=params['cuda'])
+
+    # CTGAN synthesizer
+    elif params['synthesizer'] == 'ctgan':
+        return CTGANSynthesizer(
+            metadata=metadata,
+            enforce_min_max_values=params['enforce_min_max_values'],
+            enforce_rounding=params['enforce_rounding'],
+            epochs=params['epochs'],
+            verbose=True,
+            cuda=params['cuda'])
+
+    # Gaussian Copula synthesizer
+    elif params['synthesizer'] == 'gaussian_copula':
+        return GaussianCopulaSynthesizer(
+            metadata=metadata,
+            enforce_min_max_values=params['enforce_min_max_values'],
+            enforce_rounding=params['enforce_rounding'],
+            numerical_distributions=params['numerical_distributions'],
+            default_distribution=params['default_distribution'])
+
+    # TVAE synthesizer
+    elif params['synthesizer'] == 'tvae':
+        return TVAESynthesizer(
+            metadata=metadata,
+            enforce_min_max_values=params['enforce_min_max_values'],
+            enforce_rounding=params['enforce_rounding'],
+            epochs=params['epochs'],
+            cuda=params['cuda'])
+
+    raise ValueError('Invalid synthetizer')
+
+
+# Fit the synthesizer on the dataset file, or on a sample of it when the parameters limit the fit rows,
+# returning the synthesizer, the data it was fitted on and information about the fit.
+# CTGAN, CopulaGAN and TVAE resume from the checkpoint in the given path and save their progress there
+def fit_synthesizer(path, metadata, params, row_count, checkpoint_path=None):
+    from sdv.metadata import SingleTableMetadata
+    from sampling import draw_fit_sample
+    from training import TrainingControl, controlled_training
+
+    if isinstance(metadata, dict):
+        metadata = SingleTableMetadata.load_from_dict(metadata)
+
+    fit_data = None
+    strategy = 'full'
+    if params.get('max_fit_rows'):
+        # the sample is drawn by streaming the file, the whole dataset is never loaded
+        fit_data, strategy = draw_fit_sample(path, params['max_fit_rows'], params['fit_sampling'],
+                                             metadata.to_dict(), row_count)
+    if fit_data is None:
+        fit_data = read_data_file(path)
+
+    # train the synthesizer with the real data
+    synthesizer = build_synthesizer(params, metadata)
+    start = time.perf_counter()
+    if params['synthesizer'] in EPOCH_SYNTHESIZERS and checkpoint_path is not None:
+        control = TrainingControl(checkpoint_path, patience=params.get('patience'),
+                                  max_seconds=params.get('max_fit_seconds'))
+        with controlled_training(control):
+            synthesizer.fit(fit_data)
+        training_info = control.get_info()
+    else:
+        synthesizer.fit(fit_data)
+        training_info = {}
+    fit_info = {'fit_rows': len(fit_data), 'fit_strategy': strategy, 'fit_seconds': time.perf_counter() - start}
+    fit_info.update(training_info)
+
+    # a fit cut by the time budget keeps its checkpoint for the next run, a complete one does not need it
+    fit_info['partial'] = training_info.get('stopped') == 'time_budget'
+    if checkpoint_path is not None and not fit_info['partial'] and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return synthesizer, fit_data, fit_info
+
+
+# Return the SDV synthesizer inside the preset, or the synthesizer itself
+def get_single_table_synthesizer(synthesizer):
+    return getattr(synthesizer, '_synthesizer', synthesizer)
+
+
+# Sample a batch of rows with the random stream of the batch with the given index, so each batch is the same
+# whichever process samples it
+def sample_batch(synthesizer, rows, seed=C.SAMPLE_SEED, index=0):
+    state = int(np.random.SeedSequence(seed, spawn_key=(index,)).generate_state(1)[0])
+    # the model draws from its own generator, the data transformers from the global ones
+    get_single_table_synthesizer(synthesizer)._set_random_state(state)
+    np.random.seed(state)
+    random.seed(state)
+    # without an output file SDV writes its progress to a temporary file in the working directory,
+    # shared by all the processes sampling at the same time
+    return synthesizer.sample(rows, output_file_path='disable')
+
+
+# Receive the synthesizer and limit the threads of a sampling process
+def init_sampling_process(synthesizer_bytes, threads):
+    global process_synthesizer
+    set_thread_limit(threads)
+    process_synthesizer = cloudpickle.loads(synthesizer_bytes)
+
+
+# Sample a batch, with the synthesizer of the sampling process if none is given,
+# and return its rows, its csv header and its csv lines
+def sample_csv_batch(task, synthesizer=None):
+    rows, seed, index = task
+    batch = sample_batch(synthesizer or process_synthesizer, rows, seed, index)
+    return len(batch), batch.head(0).to_csv(index=False), batch.to_csv(index=False, header=False)
+
+
+# Return the processes that sample the synthesizer at the same time
+def get_sampling_workers(synthesizer, batches):
+    # the processes would generate the same primary keys, the key generator only advances in one process
+    if get_single_table_synthesizer(synthesizer).metadata.primary_key is not None:
+        return 1
+    return max(1, min(C.SAMPLE_WORKERS, batches))
+
+
+# Sample the tasks in the pool and yield the batches in order. At most window batches are being sampled or waiting
+# to be written, the next task is sent to the pool once a batch has been written
+def sample_in_window(pool, tasks, window):
+    tasks = iter(tasks)
+    pending = collections.deque(pool.apply_async(sample_csv_batch, (task,)) for task in itertools.islice(tasks, window))
+    while pending:
+        yield pending.popleft().get()
+        for task in itertools.islice(tasks, 1):
+            pending.append(pool.apply_async(sample_csv_batch, (task,)))
+
+
+# Append the sampled batches to the csv file in order and return the rows written
+def write_csv_batches(file, batches, written, on_batch=None):
+    for rows, header, lines in batches:
+        if rows == 0:
+            raise ValueError('The synthesizer could not sample more rows.')
+        # write the whole batch at once so readers of the partial file see complete lines
+        file.write(lines if written > 0 else header + lines)
+        file.flush()
+        written += rows
+
+        if on_batch is not None:
+            on_batch(written)
+    return written
+
+
+# Sample the rows in batches appended to a csv file, compressed with the given compression if there is one.
+# Several processes sample the batches at the same time and only two batches per process are in memory, however
+# slow the file is written.
+# The same seed gives the same file with any number of processes, batch i is always sampled with the random
+# stream i of the seed
+def sample_to_csv(synthesizer, rows, path, batch_rows, on_batch=None, seed=C.SAMPLE_SEED, compression=None):
+    written = 0
+    index = 0
+    with open_text_file(path, compression) as file:
+        while written < rows:
+            # the batches still needed, more are planned if the constraints rejected some rows
+            remaining = rows - written
+            tasks = [(min(batch_rows, remaining - start), seed, index + i)
+                     for i, start in enumerate(range(0, remaining, batch_rows))]
+            index += len(tasks)
+
+            workers = get_sampling_workers(synthesizer, len(tasks))
+            if workers > 1:
+                # the synthesizer is sent once to each process, not with every batch
+                with Pool(processes=workers, initializer=init_sampling_process,
+                          initargs=(cloudpickle.dumps(synthesizer), get_pool_threads(workers))) as pool:
+                    written = write_csv_batches(file, sample_in_window(pool, tasks, 2 * workers), written, on_batch)
+            else:
+                batches = (sample_csv_batch(task, synthesizer) for task in tasks)
+                written = write_csv_batches(file, batches, written, on_batch)
+    return written
@@ -18,6 +18,18 @@ from sdv.single_table import GaussianCopulaSynthesizer
 from sdmetrics.reports.single_table import QualityReport
 
 
+# Upload the data as a csv file with the given name for the user from a process of its own, as the gunicorn workers
+# do, and return the status code of the response
+def upload_in_process(user_id, name, data):
+    import io
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+    response = client.post('/upload', data={'dataset': (io.BytesIO(data), name)}, content_type='multipart/form-data')
+    return response.status_code
+
+
 # Run this file when the server is running (python main.py) and the database is empty
 
 class TestApp(unittest.TestCase):
@@ -28,7 +40,11 @@ class TestApp(unittest.TestCase):
 
     def tearDown(self):
         with app.app_context():
-            from models import User, Dataset
+            from models import User, Dataset, Job
+
+            jobs = Job.query.all()
+            for job in jobs:
+                db.session.delete(job)
 
             datasets = Dataset.query.all()
             for dataset in datasets:
@@ -68,7 +84,8 @@ class TestApp(unittest.TestCase):
             db.session.commit()
 
             authenticated_user = authenticate_user('test', 'test')
-            loaded_dataset = load_dataset(1)
+            # the ids of the deleted datasets are not reused
+            loaded_dataset = load_dataset(dataset.id)
 
         self.assertEqual(authenticated_user.username, 'test')
         self.assertTrue(bcrypt.check_password_hash(authenticated_user.password, 'test'))
@@ -154,6 +171,1063 @@ class TestApp(unittest.TestCase):
             self.assertTrue(has_header(file))
             self.assertFalse(separate_with_comma(file))
 
+    # Unit test 6 - check if a queued job can only be claimed by one process
+    def test_unit_6_job_claim(self):
+        from models import User, Dataset, Job
+        from jobs import claim_job, is_stale
+        from utils import build_system
+        from datetime import datetime
+        from app import bcrypt
+
+        build_system()
+
+        with app.app_context():
+            user = User(username='test', password=bcrypt.generate_password_hash('test'))
+            db.session.add(user)
+            db.session.commit()
+            dataset = Dataset(name='test', path='test', user_id=user.id)
+            db.session.add(dataset)
+            db.session.commit()
+            job = Job(params='{}', pid=os.getpid(), created_at=datetime.utcnow(), dataset_id=dataset.id, user_id=user.id)
+            db.session.add(job)
+            db.session.commit()
+
+            self.assertFalse(is_stale(job))
+            self.assertTrue(claim_job(job.id))
+            self.assertFalse(claim_job(job.id))
+
+            job = Job.query.get(job.id)
+            self.assertEqual(job.status, 'running')
+            self.assertEqual(job.attempts, 1)
+
+    # Unit test 7 - check if the fitted models are reused and evicted from the registry
+    def test_unit_7_model_registry(self):
+        import config as C
+        from registry import get_model_key, get_model_path, load_model, save_model, memory_cache
+        from utils import build_system
+
+        build_system()
+
+        params = {'synthesizer': 'ctgan', 'rows': 150, 'enforce_min_max_values': True, 'enforce_rounding': True,
+                  'epochs': 10, 'cuda': False, 'numerical_distributions': None, 'default_distribution': None}
+        key = get_model_key('checksum', params)
+        self.assertEqual(key, get_model_key('checksum', dict(params, rows=1000)))
+        self.assertNotEqual(key, get_model_key('checksum', dict(params, epochs=20)))
+        self.assertNotEqual(key, get_model_key('other', params))
+
+        save_model(key, {'fitted': True}, {'fit_rows': 150})
+        memory_cache.clear()
+        self.assertEqual(load_model(key), ({'fitted': True}, {'fit_rows': 150}))
+        self.assertEqual(load_model(get_model_key('unknown', params)), (None, None))
+
+        # a full registry only keeps the last saved model
+        other_key = get_model_key('other', params)
+        max_bytes = C.MODEL_REGISTRY_MAX_BYTES
+        C.MODEL_REGISTRY_MAX_BYTES = 0
+        try:
+            save_model(other_key, {'fitted': False})
+        finally:
+            C.MODEL_REGISTRY_MAX_BYTES = max_bytes
+        self.assertFalse(os.path.exists(get_model_path(key)))
+        self.assertTrue(os.path.exists(get_model_path(other_key)))
+        os.remove(get_model_path(other_key))
+
+    # Unit test 8 - check if the synthetic rows are sampled and written in bounded batches
+    def test_unit_8_sample_in_batches(self):
+        import tempfile
+        import config as C
+        from synthesizers import sample_to_csv
+
+        class FakeSynthesizer:
+            def __init__(self):
+                self.requested = []
+                self.metadata = SingleTableMetadata()
+
+            def _set_random_state(self, random_state):
+                pass
+
+            def sample(self, num_rows, output_file_path=None):
+                self.requested.append(num_rows)
+                return pd.DataFrame({'a': range(num_rows), 'b': ['x'] * num_rows})
+
+        synthesizer = FakeSynthesizer()
+        progress = []
+        sample_workers = C.SAMPLE_WORKERS
+        C.SAMPLE_WORKERS = 1
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'synthetic.csv')
+                written = sample_to_csv(synthesizer, 25, path, 10, progress.append)
+                synthetic_data = pd.read_csv(path)
+        finally:
+            C.SAMPLE_WORKERS = sample_workers
+
+        self.assertEqual(written, 25)
+        self.assertEqual(synthesizer.requested, [10, 10, 5])
+        self.assertEqual(progress, [10, 20, 25])
+        self.assertEqual(len(synthetic_data), 25)
+        self.assertEqual(list(synthetic_data.columns), ['a', 'b'])
+
+    # Unit test 9 - check if the metadata is stored and detected again when the file changes
+    def test_unit_9_metadata_cache(self):
+        import shutil
+        import tempfile
+        from models import User, Dataset
+        from utils import build_system, get_dataset_metadata_dict
+        from app import bcrypt
+
+        build_system()
+
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        root_dir = os.path.dirname(script_dir)
+        examples_dir = os.path.join(root_dir, 'examples')
+
+        with tempfile.TemporaryDirectory() as directory, app.app_context():
+            path = os.path.join(directory, 'iris.csv')
+            shutil.copy(os.path.join(examples_dir, 'iris.csv'), path)
+
+            user = User(username='test', password=bcrypt.generate_password_hash('test'))
+            db.session.add(user)
+            db.session.commit()
+            dataset = Dataset(name='iris.csv', path=path, user_id=user.id)
+            db.session.add(dataset)
+            db.session.commit()
+
+            metadata = get_dataset_metadata_dict(dataset)
+            self.assertIn('sepal_length', metadata['columns'])
+            self.assertIsNotNone(dataset.sdv_metadata)
+
+            # the stored metadata is reused while the file does not change
+            signature = dataset.metadata_signature
+            self.assertEqual(get_dataset_metadata_dict(dataset), metadata)
+            self.assertEqual(dataset.metadata_signature, signature)
+
+            pd.read_csv(path)[['sepal_length', 'sepal_width']].to_csv(path, index=False)
+            metadata = get_dataset_metadata_dict(dataset)
+            self.assertEqual(list(metadata['columns'].keys()), ['sepal_length', 'sepal_width'])
+
+    # Unit test 10 - check if the columnar copy keeps the data and can be read by columns and rows
+    def test_unit_1_0_columnar_storage(self):
+        import tempfile
+        from utils import convert_to_columnar, read_data_file
+
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        root_dir = os.path.dirname(script_dir)
+        examples_dir = os.path.join(root_dir, 'examples')
+        iris = pd.read_csv(os.path.join(examples_dir, 'iris.csv'))
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'iris.feather')
+            convert_to_columnar(os.path.join(examples_dir, 'iris.csv'), path)
+
+            pd.testing.assert_frame_equal(read_data_file(path), iris)
+            projected = read_data_file(path, columns=['petal_width', 'sepal_length'], nrows=5)
+
+        self.assertEqual(list(projected.columns), ['petal_width', 'sepal_length'])
+        pd.testing.assert_frame_equal(projected, iris[['petal_width', 'sepal_length']].head(5))
+
+    # Unit test 11 - check if the training samples are drawn in batches with the expected sizes and proportions
+    def test_unit_1_1_fit_sample(self):
+        import config as C
+        from sampling import reservoir_sample, stratified_sample, allocate_strata
+
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        root_dir = os.path.dirname(script_dir)
+        examples_dir = os.path.join(root_dir, 'examples')
+        path = os.path.join(examples_dir, 'iris.csv')
+        iris = pd.read_csv(path)
+
+        batch_rows = C.SAMPLE_BATCH_ROWS
+        C.SAMPLE_BATCH_ROWS = 40
+        try:
+            uniform = reservoir_sample(path, 30)
+            stratified = stratified_sample(path, 30, ['class'])
+            too_many_strata = stratified_sample(path, 30, ['sepal_length', 'sepal_width'])
+        finally:
+            C.SAMPLE_BATCH_ROWS = batch_rows
+
+        self.assertEqual(len(uniform), 30)
+        self.assertEqual(list(uniform.columns), list(iris.columns))
+        self.assertEqual(len(uniform.merge(iris.drop_duplicates())), len(uniform))
+
+        self.assertEqual(stratified['class'].value_counts().to_dict(),
+                         {'Iris-setosa': 10, 'Iris-versicolor': 10, 'Iris-virginica': 10})
+        self.assertIsNone(too_many_strata)
+
+        allocation = allocate_strata(pd.Series({'a': 97, 'b': 2, 'c': 1}), 10)
+        self.assertEqual(allocation.to_dict(), {'a': 8, 'b': 1, 'c': 1})
+
+    # Unit test 12 - check that the training stops on a loss plateau and resumes from its checkpoint
+    def test_unit_1_2_training_control(self):
+        import tempfile
+        import torch
+        from training import TrainingControl
+
+        class Model:
+            loss_values = None
+
+        network = torch.nn.Linear(2, 1)
+        model = Model()
+        checkpoint_path = os.path.join(tempfile.mkdtemp(), 'model.ckpt')
+        control = TrainingControl(checkpoint_path, patience=2, checkpoint_every=1)
+        losses = [3.0, 2.0, 2.0, 2.0, 1.0]
+        epochs = []
+        try:
+            epoch = control.next_epoch({'self': model, 'network': network}, len(losses))
+            while True:
+                epochs.append(epoch)
+                model.loss_values = pd.DataFrame({'Epoch': epochs, 'Generator Loss': losses[:len(epochs)]})
+                epoch = control.next_epoch({'self': model, 'network': network}, len(losses))
+        except StopIteration:
+            pass
+
+        self.assertEqual(epochs, [0, 1, 2, 3])
+        self.assertEqual(control.get_info()['stopped'], 'plateau')
+        self.assertEqual(control.get_info()['epochs_run'], 4)
+
+        resumed = TrainingControl(checkpoint_path)
+        self.assertEqual(resumed.next_epoch({'self': Model(), 'network': torch.nn.Linear(2, 1)}, 10), 3)
+        self.assertEqual(resumed.get_info()['resumed_from_epoch'], 3)
+
+    # Unit test 13 - check that the cores are split among the concurrent tasks
+    def test_unit_1_3_thread_budget(self):
+        import config as C
+        import json
+        from models import Job
+        from threads import get_task_threads, get_pool_threads, get_thread_allocation, set_thread_limit
+
+        budget, web_workers, workers = C.THREAD_BUDGET, C.WEB_WORKERS, C.WORKERS
+        C.THREAD_BUDGET, C.WEB_WORKERS, C.WORKERS = 32, 2, 3
+        try:
+            self.assertEqual(get_task_threads(), 4)
+            set_thread_limit(get_task_threads())
+            self.assertEqual(os.environ['OMP_NUM_THREADS'], '4')
+            self.assertEqual(get_pool_threads(3), 1)
+
+            # a job is reported with the processes of its pool, which get a thread each at least
+            job = Job(id=1, kind='leaderboard', pid=1, params=json.dumps({'synthesizers': [{}] * 8}))
+            self.assertEqual(get_thread_allocation([job])['running_jobs'][0]['threads'], C.LEADERBOARD_WORKERS)
+            job = Job(id=2, kind='leaderboard', pid=1, params=json.dumps({'synthesizers': [{}, {}]}))
+            self.assertEqual(get_thread_allocation([job])['running_jobs'][0]['process_threads'], 2)
+
+            C.THREAD_BUDGET = 4
+            self.assertEqual(get_task_threads(), 1)
+        finally:
+            C.THREAD_BUDGET, C.WEB_WORKERS, C.WORKERS = budget, web_workers, workers
+            set_thread_limit(get_task_threads())
+
+    # Unit test 14 - check that the sampling processes give the same synthetic data as a single process
+    def test_unit_1_4_parallel_sampling(self):
+        import tempfile
+        import config as C
+        from synthesizers import sample_to_csv, sample_in_window
+
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        root_dir = os.path.dirname(script_dir)
+        iris = pd.read_csv(os.path.join(root_dir, 'examples', 'iris.csv'))
+        metadata = SingleTableMetadata()
+        metadata.detect_from_dataframe(iris)
+        synthesizer = GaussianCopulaSynthesizer(metadata)
+        synthesizer.fit(iris)
+
+        sample_workers = C.SAMPLE_WORKERS
+        results = {}
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                for workers, seed in [(1, 0), (3, 0), (3, 1)]:
+                    C.SAMPLE_WORKERS = workers
+                    path = os.path.join(directory, 'synthetic_' + str(workers) + '_' + str(seed) + '.csv')
+                    sample_to_csv(synthesizer, 100, path, 30, seed=seed)
+                    results[(workers, seed)] = pd.read_csv(path)
+        finally:
+            C.SAMPLE_WORKERS = sample_workers
+
+        self.assertEqual(len(results[(3, 0)]), 100)
+        pd.testing.assert_frame_equal(results[(1, 0)], results[(3, 0)])
+        self.assertFalse(results[(3, 0)].equals(results[(3, 1)]))
+        # the batches use different random streams, they are not copies of each other
+        self.assertFalse(results[(3, 0)].iloc[:30].reset_index(drop=True).equals(
+            results[(3, 0)].iloc[30:60].reset_index(drop=True)))
+
+        # Pool that samples each batch when it is sent and counts the batches sent
+        class CountingPool:
+            sent = 0
+
+            def apply_async(self, function, args):
+                self.sent += 1
+                batch = function(*args, synthesizer)
+                return type('Result', (), {'get': lambda self: batch})()
+
+        # a slow writer does not let the batches pile up, the next one is sent once one is written
+        pool = CountingPool()
+        tasks = [(10, 0, index) for index in range(20)]
+        for written, batch in enumerate(sample_in_window(pool, tasks, 6)):
+            self.assertLessEqual(pool.sent, written + 6)
+        self.assertEqual(pool.sent, 20)
+
+    # Unit test 15 - check that a fresh worker serves a light page without loading the machine learning libraries
+    def test_unit_1_5_lazy_imports(self):
+        from benchmark_startup import measure_worker
+
+        result = measure_worker()
+        self.assertEqual(result['status'], 200)
+        self.assertEqual(result['heavy_modules'], [])
+
+    # Unit test 16 - check that every plot of the evaluation page is rendered, also by concurrent requests
+    def test_unit_1_6_parallel_plots(self):
+        import tempfile
+        from concurrent.futures import ThreadPoolExecutor
+        from plots import render_evaluation_plots
+
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        root_dir = os.path.dirname(script_dir)
+        iris = pd.read_csv(os.path.join(root_dir, 'examples', 'iris.csv'))
+        synthetic_data = iris.sample(frac=1, random_state=0).reset_index(drop=True)
+        column_pairs = [('sepal_length', 'sepal_width'), ('petal_length', 'petal_width')]
+
+        with tempfile.TemporaryDirectory() as directory:
+            render_evaluation_plots(iris, synthetic_data, list(iris.columns), column_pairs, os.path.join(directory, '1'))
+            files = sorted(os.listdir(directory))
+
+        expected = ['1' + column + '.png' for column in iris.columns]
+        expected += ['1' + column1 + column2 + suffix + '.png' for column1, column2 in column_pairs for suffix in ['', 'reg']]
+        self.assertEqual(files, sorted(expected))
+
+        # the requests of a threaded server render in the same process at the same time, each with its columns
+        requests = [[column] for column in iris.columns] + [list(pair) for pair in column_pairs]
+        with tempfile.TemporaryDirectory() as directory, ThreadPoolExecutor(max_workers=len(requests)) as executor:
+            futures = [executor.submit(render_evaluation_plots, iris[columns], synthetic_data[columns],
+                                       columns[:1] if len(columns) == 1 else [],
+                                       [tuple(columns)] if len(columns) == 2 else [], os.path.join(directory, '2'))
+                       for columns in requests]
+            for future in futures:
+                future.result()
+            files = sorted(os.listdir(directory))
+        self.assertEqual(files, sorted(name.replace('1', '2', 1) for name in expected))
+
+    # Unit test 17 - check that an evaluation is computed once for each pair of real and synthetic files
+    def test_unit_1_7_evaluation_cache(self):
+        from evaluation import get_evaluation_key, get_evaluation_dir, load_evaluation, save_evaluation, \
+            remove_evaluations
+
+        computed = []
+
+        def compute(directory):
+            computed.append(directory)
+            with open(os.path.join(directory, '1column.png'), 'wb') as file:
+                file.write(b'png')
+            return {'score': 0.9, 'properties': [], 'column_pairs': [['a', 'b']]}
+
+        key = get_evaluation_key('real', 'synthetic')
+        self.assertNotEqual(key, get_evaluation_key('real', 'other synthetic'))
+        with app.app_context():
+            try:
+                self.assertIsNone(load_evaluation(999, key))
+                evaluation = save_evaluation(999, key, compute)
+                self.assertEqual(load_evaluation(999, key), evaluation)
+                self.assertEqual(evaluation['score'], 0.9)
+                self.assertEqual(len(computed), 1)
+                self.assertTrue(os.path.exists(os.path.join(app.root_path, get_evaluation_dir(999, key), '1column.png')))
+            finally:
+                remove_evaluations(999)
+            self.assertIsNone(load_evaluation(999, key))
+
+    # Unit test 18 - check that the pair plots of large datasets use a bounded rendering
+    def test_unit_1_8_bounded_pair_plots(self):
+        import tempfile
+        import config as C
+        import plots
+
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        root_dir = os.path.dirname(script_dir)
+        iris = pd.read_csv(os.path.join(root_dir, 'examples', 'iris.csv'))
+
+        max_rows, mode = C.SCATTER_MAX_ROWS, C.SCATTER_MODE
+        C.SCATTER_MAX_ROWS = 50
+        try:
+            self.assertEqual(plots.get_scatter_mode(iris.head(50), iris.head(50)), 'scatter')
+            with tempfile.TemporaryDirectory() as directory:
+                for scatter_mode in ['sample', 'hexbin', 'hist2d']:
+                    C.SCATTER_MODE = scatter_mode
+                    self.assertEqual(plots.get_scatter_mode(iris, iris.head(50)), scatter_mode)
+                    plots.use_file_backend()
+                    plots.render_pair_plots([('sepal_length', 'sepal_width')], os.path.join(directory, scatter_mode),
+                                            iris, iris)
+                    self.assertTrue(os.path.exists(os.path.join(directory, scatter_mode + 'sepal_lengthsepal_width.png')))
+                    self.assertTrue(os.path.exists(os.path.join(directory, scatter_mode + 'sepal_lengthsepal_widthreg.png')))
+        finally:
+            C.SCATTER_MAX_ROWS, C.SCATTER_MODE = max_rows, mode
+
+    # Unit test 19 - check that the fast evaluation gives the scores of the SDMetrics quality report
+    def test_unit_1_9_fast_evaluation(self):
+        from sdmetrics.reports.single_table import QualityReport
+        from fidelity import evaluate_fidelity
+
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        root_dir = os.path.dirname(script_dir)
+        real_data = pd.read_csv(os.path.join(root_dir, 'examples', 'iris.csv'))
+        # a shifted copy with missing values and a category the real data does not have
+        synthetic_data = real_data.sample(frac=1, replace=True, random_state=0).reset_index(drop=True)
+        synthetic_data['sepal_length'] = synthetic_data['sepal_length'] + 0.3
+        synthetic_data.loc[:9, 'petal_width'] = None
+        synthetic_data.loc[10:14, 'class'] = 'Iris-unknown'
+        metadata = {'columns': {'sepal_length': {'sdtype': 'numerical'}, 'sepal_width': {'sdtype': 'numerical'},
+                                'petal_length': {'sdtype': 'numerical'}, 'petal_width': {'sdtype': 'numerical'},
+                                'class': {'sdtype': 'categorical'}}}
+
+        report = QualityReport()
+        report.generate(real_data, synthetic_data, metadata, verbose=False)
+        fidelity = evaluate_fidelity(real_data, synthetic_data, metadata)
+
+        self.assertAlmostEqual(fidelity['score'], report.get_score(), places=4)
+        for full, fast in zip(report.get_properties().to_dict(orient='records'), fidelity['properties']):
+            self.assertEqual(full['Property'], fast['Property'])
+            self.assertAlmostEqual(full['Score'], fast['Score'], places=4)
+
+    # Unit test 20 - check that the regression lines of all the pairs match a fit of each pair without its missing rows
+    def test_unit_2_0_regression_lines(self):
+        import json
+        import numpy as np
+        from utils import get_regression_lines, get_evaluation_statistics
+
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        root_dir = os.path.dirname(script_dir)
+        iris = pd.read_csv(os.path.join(root_dir, 'examples', 'iris.csv'))
+        iris.loc[::7, 'sepal_width'] = None
+        iris.loc[::11, 'petal_length'] = None
+        iris['constant'] = 1.0
+
+        column_pairs = [('sepal_length', 'sepal_width'), ('sepal_width', 'petal_length'), ('petal_length', 'petal_width')]
+        lines = get_regression_lines(iris, column_pairs + [('constant', 'sepal_length')])
+        for column1, column2 in column_pairs:
+            pair = iris[[column1, column2]].dropna()
+            slope, intercept = np.polyfit(pair[column1], pair[column2], 1)
+            self.assertAlmostEqual(lines[(column1, column2)][0], slope)
+            self.assertAlmostEqual(lines[(column1, column2)][1], intercept)
+        self.assertTrue(np.isnan(lines[('constant', 'sepal_length')][0]))
+
+        # the statistics stored with the evaluation are the ones pandas gives
+        synthetic = iris.sample(frac=1, replace=True, random_state=0)
+        statistics = json.loads(json.dumps(get_evaluation_statistics(iris, synthetic, column_pairs)))
+        columns = dict(statistics['columns'])
+        self.assertAlmostEqual(columns['sepal_width']['synthetic']['mean'], synthetic['sepal_width'].mean())
+        self.assertAlmostEqual(columns['petal_length']['real']['std'], iris['petal_length'].std())
+        self.assertEqual(columns['class']['real']['mode'], iris['class'].mode()[0])
+        pair = statistics['pairs'][1]
+        self.assertAlmostEqual(pair['real']['covariance'], iris['sepal_width'].cov(iris['petal_length']))
+        self.assertAlmostEqual(pair['synthetic']['correlation'], synthetic['sepal_width'].corr(synthetic['petal_length']))
+        self.assertAlmostEqual(pair['real']['slope'], lines[('sepal_width', 'petal_length')][0])
+
+    # Unit test 21 - check that the approximate evaluation records its samples and stops at the target interval
+    def test_unit_2_1_approximate_evaluation(self):
+        from fidelity import approximate_fidelity, evaluate_fidelity
+
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        root_dir = os.path.dirname(script_dir)
+        real_data = pd.read_csv(os.path.join(root_dir, 'examples', 'iris.csv'))
+        synthetic_data = real_data.sample(frac=1, replace=True, random_state=0).reset_index(drop=True)
+        metadata = {'columns': {'sepal_length': {'sdtype': 'numerical'}, 'sepal_width': {'sdtype': 'numerical'},
+                                'petal_length': {'sdtype': 'numerical'}, 'petal_width': {'sdtype': 'numerical'},
+                                'class': {'sdtype': 'categorical'}}}
+
+        # an interval that can never be reached takes the maximum of samples
+        fidelity = approximate_fidelity(real_data, synthetic_data, metadata, 50, 3, 8, 0, 0.95, 0)
+        approximation = fidelity['approximation']
+        self.assertEqual(approximation['samples'], 8)
+        self.assertEqual(approximation['sample_rows'], 50)
+        self.assertEqual(approximation['real_rows'], 150)
+        self.assertFalse(approximation['converged'])
+        self.assertLessEqual(approximation['interval'][0], fidelity['score'])
+        self.assertGreaterEqual(approximation['interval'][1], fidelity['score'])
+        self.assertEqual(len(fidelity['column_shapes']), 5)
+
+        # the samples score lower than all the rows, the corrected estimate and its interval are for all the rows,
+        # and the interval is the one of the mean of the samples, it closes up with more samples
+        exact = evaluate_fidelity(real_data, synthetic_data, metadata)['score']
+        self.assertGreater(approximation['bias'], 0)
+        self.assertLessEqual(approximation['interval'][0], exact)
+        self.assertGreaterEqual(approximation['interval'][1], exact)
+        more = approximate_fidelity(real_data, synthetic_data, metadata, 50, 30, 30, 0, 0.95, 0)['approximation']
+        self.assertLess(more['interval'][1] - more['interval'][0],
+                        approximation['interval'][1] - approximation['interval'][0])
+
+        # a wide interval stops at the minimum of samples, and the same seed gives the same estimate
+        wide = approximate_fidelity(real_data, synthetic_data, metadata, 50, 3, 8, 1, 0.95, 0)
+        self.assertEqual(wide['approximation']['samples'], 3)
+        self.assertTrue(wide['approximation']['converged'])
+        self.assertEqual(approximate_fidelity(real_data, synthetic_data, metadata, 50, 3, 8, 1, 0.95, 0)['score'],
+                         wide['score'])
+
+    # Unit test 22 - check that an upload is checked and saved in one pass, reporting the first bad line
+    def test_unit_2_2_upload_validation(self):
+        import io
+        import tempfile
+        import config as C
+        from uploads import validate_upload, check_upload, UploadCheck, UploadError, UploadPending
+        from utils import convert_to_columnar, get_file_checksum, read_data_file
+
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        root_dir = os.path.dirname(script_dir)
+        examples_dir = os.path.join(root_dir, 'examples')
+
+        chunk_bytes = C.UPLOAD_CHUNK_BYTES
+        # small chunks so the lines and the quoted values are split between chunks
+        C.UPLOAD_CHUNK_BYTES = 7
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'upload.csv')
+                with open(os.path.join(examples_dir, 'iris.csv'), 'rb') as file:
+                    info = validate_upload(file, path)
+                self.assertEqual(info['rows'], 150)
+                self.assertEqual(info['checksum'], get_file_checksum(os.path.join(examples_dir, 'iris.csv')))
+                self.assertEqual(get_file_checksum(path), info['checksum'])
+                self.assertEqual([column['dtype'] for column in info['columns']],
+                                 ['float64', 'float64', 'float64', 'float64', 'object'])
+
+                data = b'id,name,score,active\n1,"a, b",1.5,True\n2,"two\nlines",,False\n\n3,c,2,True\n'
+                info = validate_upload(io.BytesIO(data), path)
+                self.assertEqual(info['rows'], 3)
+                self.assertEqual([column['dtype'] for column in info['columns']], ['int64', 'object', 'float64', 'bool'])
+
+                # the dtypes are the ones pandas infers reading the whole file, which trims the values and reads
+                # integers with a sign but not digits with underscores
+                data = b'a,b,c,,c\n1_000,1, 2.5,x,1\n2,+3,1e3,y,2\n'
+                info = validate_upload(io.BytesIO(data), path)
+                self.assertEqual(info['columns'], [{'name': 'a', 'dtype': 'object'}, {'name': 'b', 'dtype': 'int64'},
+                                                   {'name': 'c', 'dtype': 'float64'},
+                                                   {'name': 'Unnamed: 3', 'dtype': 'object'},
+                                                   {'name': 'c.1', 'dtype': 'int64'}])
+                self.assertEqual([str(dtype) for dtype in pd.read_csv(path).dtypes],
+                                 [column['dtype'] for column in info['columns']])
+                columnar_path = os.path.join(directory, 'upload.feather')
+                convert_to_columnar(path, columnar_path, info['columns'])
+                pd.testing.assert_frame_equal(read_data_file(columnar_path), pd.DataFrame(
+                    {'a': ['1_000', '2'], 'b': [1, 3], 'c': [2.5, 1000.0], 'Unnamed: 3': ['x', 'y'], 'c.1': [1, 2]}))
+                os.remove(columnar_path)
+
+                # booleans with missing values are objects, integers above int64 are uint64 and integers no
+                # dtype holds are objects, as pandas reads them
+                data = ('a,b,c,d\nTrue,' + str(2 ** 63) + ',' + str(2 ** 64) + ',' + str(2 ** 63) + '\n,1,1,-1\n').encode()
+                info = validate_upload(io.BytesIO(data), path)
+                self.assertEqual(info['columns'], [{'name': 'a', 'dtype': 'object', 'values': 'bool'},
+                                                   {'name': 'b', 'dtype': 'uint64'},
+                                                   {'name': 'c', 'dtype': 'object'},
+                                                   {'name': 'd', 'dtype': 'object'}])
+                self.assertEqual([str(dtype) for dtype in pd.read_csv(path).dtypes],
+                                 [column['dtype'] for column in info['columns']])
+                convert_to_columnar(path, columnar_path, info['columns'])
+                data = read_data_file(columnar_path)
+                self.assertEqual([str(dtype) for dtype in data.dtypes], ['object', 'uint64', 'object', 'object'])
+                self.assertEqual(data['a'].tolist(), [True, None])
+                self.assertEqual(data['b'].tolist(), [2 ** 63, 1])
+                self.assertEqual(data['c'].tolist(), [str(2 ** 64), '1'])
+                self.assertEqual(data['d'].tolist(), [str(2 ** 63), '-1'])
+                os.remove(columnar_path)
+
+                # Stream of the bytes of the data from the given one that arrived, it waits for the rest
+                class PartStream(io.RawIOBase):
+                    def __init__(self, data, start, end):
+                        self.data = data[start:end]
+                        self.final = end >= len(data)
+
+                    def readable(self):
+                        return True
+
+                    def readinto(self, buffer):
+                        if not self.data:
+                            if self.final:
+                                return 0
+                            raise UploadPending()
+                        size = min(len(buffer), len(self.data))
+                        buffer[:size] = self.data[:size]
+                        self.data = self.data[size:]
+                        return size
+
+                # a check that stops at the bytes that did not arrive goes on from its last complete row
+                data = b'id,name,score\n' + '1,"a\nb",1.5\n\n2,\u00e9t\u00e9,2\n3,"c, d",\n'.encode('utf-8') * 20
+                expected = validate_upload(io.BytesIO(data), path)
+                parts_path = os.path.join(directory, 'parts.csv')
+                for part in [1, 5, 13, 64]:
+                    check = UploadCheck()
+                    for end in range(part, len(data) + part, part):
+                        self.assertEqual(check_upload(PartStream(data, check.size, end), parts_path, check),
+                                         end >= len(data))
+                    with open(parts_path, 'rb') as file:
+                        self.assertEqual(file.read(), data)
+                    check.checksum = get_file_checksum(parts_path)
+                    self.assertEqual(check.get_info(len(data)), expected)
+                os.remove(parts_path)
+
+                errors = [
+                    (b'id,name\n1,a\n2,b\n3,c,d\n4,e\n', 4),
+                    (b'id,name\n1,"a\nb"\n\n2\n', 5),
+                    (b'id,name\n1,a\n2,\xff\n', 3),
+                    (b'id,name\n', 2),
+                    (b'id;name\n1;a\n2;b\n', None),
+                    (b'id,n@me\n1,a\n2,b\n', 1),
+                ]
+                for data, line in errors:
+                    with self.assertRaises(UploadError) as context:
+                        validate_upload(io.BytesIO(data), path)
+                    self.assertEqual(context.exception.get_report()['line'], line)
+                    # the file of a rejected upload is not kept
+                    self.assertEqual(os.listdir(directory), ['upload.csv'])
+        finally:
+            C.UPLOAD_CHUNK_BYTES = chunk_bytes
+
+    # Unit test 23 - check that the uploads of the same content share their files until the last one is deleted
+    def test_unit_2_3_upload_deduplication(self):
+        import config as C
+        from models import User, Dataset, Blob
+        from utils import build_system
+        from app import bcrypt
+
+        build_system()
+
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        root_dir = os.path.dirname(script_dir)
+        examples_dir = os.path.join(root_dir, 'examples')
+
+        with app.app_context():
+            user = User(username='test', password=bcrypt.generate_password_hash('test'))
+            db.session.add(user)
+            db.session.commit()
+            user_id = user.id
+
+        with self.app.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+
+        for name in ['iris.csv', 'iris_copy.csv']:
+            with open(os.path.join(examples_dir, 'iris.csv'), 'rb') as file:
+                response = self.app.post('/upload', data={'dataset': (file, name)}, content_type='multipart/form-data')
+            self.assertEqual(response.status_code, 302)
+
+        with app.app_context():
+            datasets = Dataset.query.filter_by(user_id=user_id).order_by(Dataset.id).all()
+            self.assertEqual(len(datasets), 2)
+            self.assertEqual(datasets[0].path, datasets[1].path)
+            self.assertEqual(datasets[0].schema, datasets[1].schema)
+            self.assertEqual(datasets[0].sdv_metadata, datasets[1].sdv_metadata)
+            blob = db.session.get(Blob, datasets[0].checksum)
+            self.assertEqual(blob.refcount, 2)
+            ids = [dataset.id for dataset in datasets]
+            path = blob.path
+            checksum = blob.checksum
+
+        # the files are kept while another dataset points at them
+        self.app.post('/delete/' + str(ids[0]))
+        self.assertTrue(os.path.exists(path))
+        with app.app_context():
+            self.assertEqual(db.session.get(Blob, checksum).refcount, 1)
+
+        self.app.post('/delete/' + str(ids[1]))
+        self.assertFalse(os.path.exists(path))
+        with app.app_context():
+            self.assertIsNone(db.session.get(Blob, checksum))
+
+        # an upload that finds the content stored by another one, whose last dataset is deleted before the
+        # reference is added, stores the files again
+        import shutil
+        import blobs
+        acquire_blob = blobs.acquire_blob
+
+        def release_then_acquire(checksum):
+            # the files of the other upload are removed with its last reference
+            for blob_path in blobs.get_blob_paths(checksum):
+                if os.path.exists(blob_path):
+                    os.remove(blob_path)
+            Blob.query.filter_by(checksum=checksum).delete()
+            db.session.commit()
+            return acquire_blob(checksum)
+
+        csv_path = os.path.join(app.root_path, C.DATASET_PATH, 'race.csv')
+        shutil.copyfile(os.path.join(examples_dir, 'iris.csv'), csv_path)
+        with app.app_context():
+            db.session.add(Blob(checksum=checksum, path=path, refcount=1))
+            db.session.commit()
+            blobs.acquire_blob = release_then_acquire
+            try:
+                blob = blobs.store_blob(checksum, csv_path)
+            finally:
+                blobs.acquire_blob = acquire_blob
+            self.assertEqual(blob.refcount, 1)
+            self.assertTrue(os.path.exists(blob.path))
+            self.assertFalse(os.path.exists(csv_path))
+            os.remove(blob.path)
+            db.session.delete(blob)
+            db.session.commit()
+
+    # Unit test 24 - check that compressed uploads are decompressed while they are checked and that the synthetic
+    # files are written compressed and read back
+    def test_unit_2_4_compression(self):
+        import io
+        import tempfile
+        from compression import get_compressor, open_text_file, EXTENSIONS
+        from uploads import validate_upload, UploadError
+        from utils import get_file_checksum, read_data_file
+
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        root_dir = os.path.dirname(script_dir)
+        iris_path = os.path.join(root_dir, 'examples', 'iris.csv')
+        with open(iris_path, 'rb') as file:
+            iris = file.read()
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'upload.csv')
+            for compression in EXTENSIONS:
+                compressed = get_compressor(compression)(iris)
+                # the checksum is the one of the csv, so the compressed and plain uploads share their files
+                info = validate_upload(io.BytesIO(compressed), path, compression)
+                self.assertEqual(info['rows'], 150)
+                self.assertEqual(info['checksum'], get_file_checksum(iris_path))
+
+                for data in [compressed[:len(compressed) // 2], b'not compressed']:
+                    with self.assertRaises(UploadError):
+                        validate_upload(io.BytesIO(data), path, compression)
+
+                # each batch is a complete member, the file can be read after the first one
+                synthetic_path = os.path.join(directory, 'synthetic.csv' + EXTENSIONS[compression])
+                with open_text_file(synthetic_path, compression) as file:
+                    file.write('a,b\n1,2\n')
+                    file.flush()
+                    self.assertEqual(len(read_data_file(synthetic_path)), 1)
+                    file.write('3,4\n5,6\n')
+                data = read_data_file(synthetic_path)
+                self.assertEqual(data['b'].tolist(), [2, 4, 6])
+
+    # Unit test 25 - check that a chunked upload only acknowledges the next chunk with the right checksum,
+    # is checked while its chunks arrive and stops at the first bad line
+    def test_unit_2_5_chunked_upload(self):
+        import hashlib
+        import config as C
+        from models import User, Dataset, Upload
+        from resumable import get_check_path
+        from utils import build_system
+        from app import bcrypt
+
+        build_system()
+
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        root_dir = os.path.dirname(script_dir)
+        with open(os.path.join(root_dir, 'examples', 'iris.csv'), 'rb') as file:
+            iris = file.read()
+
+        with app.app_context():
+            user = User(username='test', password=bcrypt.generate_password_hash('test'))
+            db.session.add(user)
+            db.session.commit()
+            user_id = user.id
+
+        with self.app.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+
+        chunk_bytes, expire_seconds = C.UPLOAD_RESUMABLE_CHUNK_BYTES, C.UPLOAD_EXPIRE_SECONDS
+        C.UPLOAD_RESUMABLE_CHUNK_BYTES = 1000
+        try:
+            # Send the chunk with the given index of the data and return the response
+            def send_chunk(upload_id, data, index, checksum=None):
+                chunk = data[index * 1000:(index + 1) * 1000]
+                checksum = checksum or hashlib.sha256(chunk).hexdigest()
+                return self.app.put('/upload/' + str(upload_id) + '/' + str(index), data=chunk,
+                                    headers={'X-Chunk-SHA256': checksum})
+
+            # Return the status of the upload once its check has ended
+            def wait_for_check(upload_id):
+                for _ in range(200):
+                    status = self.app.get('/upload/' + str(upload_id)).get_json()
+                    if status['status'] in ['finished', 'failed']:
+                        return status
+                    time.sleep(0.05)
+                self.fail('The check of the upload did not end.')
+
+            # Wait until the check of the upload stops at the next chunk, with no process waiting for it
+            def wait_for_release(upload_id):
+                for _ in range(200):
+                    with app.app_context():
+                        if db.session.get(Upload, upload_id).pid is None:
+                            return
+                    time.sleep(0.05)
+                self.fail('The check of the upload did not stop.')
+
+            status = self.app.post('/upload/init', data={'filename': 'iris.csv', 'size': len(iris)}).get_json()
+            self.assertEqual(status['chunks'], 5)
+            self.assertEqual(send_chunk(status['id'], iris, 0).status_code, 200)
+            # the check stops at the chunk that did not arrive and keeps the point it reached
+            wait_for_release(status['id'])
+            self.assertTrue(os.path.exists(get_check_path(status['id'])))
+            # a chunk after the next one is not acknowledged, the client resumes from the next one
+            response = send_chunk(status['id'], iris, 2)
+            self.assertEqual(response.status_code, 409)
+            self.assertEqual(response.get_json()['next_chunk'], 1)
+            self.assertEqual(send_chunk(status['id'], iris, 1, checksum='0' * 64).status_code, 400)
+            for index in range(1, 5):
+                self.assertEqual(send_chunk(status['id'], iris, index).get_json()['next_chunk'], index + 1)
+            self.assertEqual(self.app.post('/upload/' + str(status['id']) + '/finalize').status_code, 202)
+
+            status = wait_for_check(status['id'])
+            self.assertEqual(status['status'], 'finished')
+            with app.app_context():
+                dataset = db.session.get(Dataset, status['dataset_id'])
+                self.assertEqual(dataset.row_count, 150)
+                self.assertEqual(dataset.checksum, hashlib.sha256(iris).hexdigest())
+                self.assertEqual(dataset.user_id, user_id)
+            self.app.post('/delete/' + str(status['dataset_id']))
+
+            # the check ends after the last chunk even if the client does not finalize, and a bad row fails it
+            bad = iris[:1500] + b'1,2\n' + iris[1500:]
+            status = self.app.post('/upload/init', data={'filename': 'iris.csv', 'size': len(bad)}).get_json()
+            for index in range(status['chunks']):
+                send_chunk(status['id'], bad, index)
+            status = wait_for_check(status['id'])
+            self.assertEqual(status['status'], 'failed')
+            self.assertTrue(status['error'].startswith('Line '))
+            self.assertEqual(self.app.post('/upload/' + str(status['id']) + '/finalize').status_code, 409)
+
+            # an upload whose client stopped sending chunks is given up
+            status = self.app.post('/upload/init', data={'filename': 'iris.csv', 'size': len(iris)}).get_json()
+            send_chunk(status['id'], iris, 0)
+            wait_for_release(status['id'])
+            C.UPLOAD_EXPIRE_SECONDS = 0
+            status = self.app.get('/upload/' + str(status['id'])).get_json()
+            self.assertEqual(status['status'], 'failed')
+            self.assertTrue(status['error'].startswith('No chunk was received'))
+        finally:
+            C.UPLOAD_RESUMABLE_CHUNK_BYTES, C.UPLOAD_EXPIRE_SECONDS = chunk_bytes, expire_seconds
+
+    # Unit test 26 - check that many uploads from several processes at the same time get their own datasets,
+    # with every file and row intact, and that the uploads of the same content share a single blob
+    def test_unit_2_6_concurrent_uploads(self):
+        import io
+        import config as C
+        from concurrent.futures import ProcessPoolExecutor
+        from models import User, Dataset, Blob
+        from utils import build_system, read_data_file
+        from jobs import init_pool_process
+        from app import bcrypt
+
+        build_system()
+
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        root_dir = os.path.dirname(script_dir)
+        iris = pd.read_csv(os.path.join(root_dir, 'examples', 'iris.csv'))
+
+        with app.app_context():
+            user = User(username='test', password=bcrypt.generate_password_hash('test'))
+            db.session.add(user)
+            db.session.commit()
+            user_id = user.id
+
+        with self.app.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+
+        # 16 different contents, each of the first 8 uploaded twice
+        contents = [iris.sample(frac=1, random_state=i).to_csv(index=False).encode() for i in range(16)]
+        uploads = [('upload_' + str(i) + '.csv', contents[i % 16]) for i in range(24)]
+        with ProcessPoolExecutor(max_workers=8, initializer=init_pool_process) as executor:
+            codes = list(executor.map(upload_in_process, [user_id] * len(uploads), *zip(*uploads)))
+        self.assertEqual(codes, [302] * len(uploads))
+
+        with app.app_context():
+            datasets = {dataset.name: dataset for dataset in Dataset.query.filter_by(user_id=user_id).all()}
+            self.assertEqual(len(datasets), len(uploads))
+            for name, content in uploads:
+                dataset = datasets[name]
+                self.assertEqual(dataset.row_count, 150)
+                expected = pd.read_csv(io.BytesIO(content))
+                pd.testing.assert_frame_equal(read_data_file(dataset.path), expected, check_dtype=False)
+            self.assertEqual(sorted(blob.refcount for blob in Blob.query.all()), [1] * 8 + [2] * 8)
+            ids = [dataset.id for dataset in datasets.values()]
+
+        # no temporary file or uploaded csv is left behind
+        for directory in [C.DATASET_PATH, C.BLOB_PATH]:
+            names = os.listdir(os.path.join(app.root_path, directory))
+            self.assertFalse([name for name in names if name.endswith('.tmp') or name.endswith(tuple(datasets))])
+
+        for id in ids:
+            self.app.post('/delete/' + str(id))
+        with app.app_context():
+            self.assertEqual(Blob.query.count(), 0)
+
+    # Unit test 27 - check that the datasets without a file or a user are deleted at startup, also the ones
+    # uploaded before the blobs
+    def test_unit_2_7_stale_datasets(self):
+        import config as C
+        from models import User, Dataset
+        from utils import build_system, remove_stale_datasets
+        from app import bcrypt
+
+        build_system()
+
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        root_dir = os.path.dirname(script_dir)
+        with open(os.path.join(root_dir, 'examples', 'iris.csv'), 'rb') as file:
+            iris = file.read()
+
+        with app.app_context():
+            user = User(username='test', password=bcrypt.generate_password_hash('test'))
+            db.session.add(user)
+            db.session.commit()
+            user_id = user.id
+        upload_in_process(user_id, 'iris.csv', iris)
+
+        with app.app_context():
+            kept = Dataset.query.filter_by(user_id=user_id).one()
+            missing_paths = [os.path.join(app.root_path, C.DATASET_PATH, name) for name in ['gone1.csv', 'gone2.csv']]
+            db.session.add_all([Dataset(name='gone.csv', path=path, user_id=user_id) for path in missing_paths])
+            db.session.commit()
+
+            remove_stale_datasets()
+            self.assertEqual([dataset.id for dataset in Dataset.query.filter_by(user_id=user_id)], [kept.id])
+            self.assertTrue(os.path.exists(kept.path))
+            kept_id = kept.id
+
+        with self.app.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+        self.app.post('/delete/' + str(kept_id))
+
+    # Unit test 28 - check that the leaderboard scores each synthesizer, sorts them by quality, reports the one
+    # that fails, marks the fit time of the reused models and shows the results
+    def test_unit_2_8_leaderboard(self):
+        import json
+        from datetime import datetime
+        from sdv.metadata import SingleTableMetadata
+        from models import User, Job
+        from leaderboard import run_leaderboard
+        from registry import get_model_key, get_model_path, memory_cache
+        from utils import build_system, get_generation_params
+        from app import bcrypt
+
+        build_system()
+
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        root_dir = os.path.dirname(script_dir)
+        iris_path = os.path.join(root_dir, 'examples', 'iris.csv')
+        iris = pd.read_csv(iris_path)
+        metadata = SingleTableMetadata()
+        metadata.detect_from_dataframe(iris)
+
+        # the options of the leaderboard form, shared by the synthesizers
+        form = {'rows_1': '100', 'enforce_min_max_values_1': 'Yes', 'enforce_rounding_1': 'Yes',
+                'default_distribution_1': 'beta'}
+        form.update({column + '_1': 'none' for column in iris.columns})
+        tasks = []
+        for name in ['fast_ml', 'gaussian_copula']:
+            params = get_generation_params(dict(form, synthetizer_1=name), 1, list(iris.columns))
+            tasks.append({'path': iris_path, 'metadata': metadata.to_dict(), 'checksum': 'leaderboard_test',
+                          'row_count': len(iris), 'rows': 100, 'params': params})
+        # a synthesizer whose fit fails gets an error entry instead of stopping the others
+        tasks.append(dict(tasks[1], path=os.path.join(root_dir, 'examples', 'missing.csv'), checksum='missing'))
+
+        try:
+            leaderboard = run_leaderboard(tasks)
+            self.assertEqual(len(leaderboard), 3)
+            for result in leaderboard[:2]:
+                self.assertNotIn('error', result)
+                self.assertFalse(result['cached'])
+                self.assertTrue(0 <= result['quality'] <= 1)
+                self.assertGreater(result['fit_seconds'], 0)
+                self.assertGreater(result['sample_rows_per_second'], 0)
+                self.assertGreaterEqual(result['peak_memory_mb'], 0)
+            self.assertEqual(sorted(result['synthesizer'] for result in leaderboard[:2]), ['fast_ml', 'gaussian_copula'])
+            self.assertGreaterEqual(leaderboard[0]['quality'], leaderboard[1]['quality'])
+            self.assertEqual(leaderboard[2]['synthesizer'], 'gaussian_copula')
+            self.assertIn('error', leaderboard[2])
+
+            # the models fitted before are reused, their fit time is the one recorded then and is marked
+            memory_cache.clear()
+            cached = {result['synthesizer']: result for result in run_leaderboard(tasks[:2])}
+            for result in leaderboard[:2]:
+                self.assertTrue(cached[result['synthesizer']]['cached'])
+                self.assertEqual(cached[result['synthesizer']]['fit_seconds'], result['fit_seconds'])
+
+            with app.app_context():
+                user = User(username='test', password=bcrypt.generate_password_hash('test'))
+                db.session.add(user)
+                db.session.commit()
+                job = Job(kind='leaderboard', status='finished', params=json.dumps({}), created_at=datetime.utcnow(),
+                          dataset_id=0, user_id=user.id, info=json.dumps({'leaderboard': list(cached.values()) + leaderboard[2:]}))
+                db.session.add(job)
+                db.session.commit()
+                user_id, job_id = user.id, job.id
+
+            with self.app.session_transaction() as session:
+                session['_user_id'] = str(user_id)
+            response = self.app.get('/result/' + str(job_id))
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(b'gaussian_copula', response.data)
+            self.assertIn(b'(cached)', response.data)
+            self.assertIn(b'Failed:', response.data)
+        finally:
+            for task in tasks:
+                path = get_model_path(get_model_key(task['checksum'], task['params']))
+                if os.path.exists(path):
+                    os.remove(path)
+
+    # Unit test 29 - check that the column pickers are rendered from the schema index without reading the dataset
+    def test_unit_2_9_schema_index_pickers(self):
+        from types import SimpleNamespace
+        from unittest import mock
+        from models import User, Dataset
+        from utils import build_system
+        from app import bcrypt
+
+        build_system()
+
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        root_dir = os.path.dirname(script_dir)
+        with open(os.path.join(root_dir, 'examples', 'iris.csv'), 'rb') as file:
+            iris = file.read()
+
+        with app.app_context():
+            user = User(username='test', password=bcrypt.generate_password_hash('test'))
+            db.session.add(user)
+            db.session.commit()
+            user_id = user.id
+        upload_in_process(user_id, 'iris.csv', iris)
+
+        with app.app_context():
+            dataset = Dataset.query.filter_by(user_id=user_id).one()
+            dataset_id, dataset_path = dataset.id, dataset.path
+        with self.app.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+
+        # any read of a dataset file fails, the pages only have the database to work with
+        def fail_read(*args, **kwargs):
+            raise AssertionError('the dataset file was read')
+        columns = ['sepal_length', 'sepal_width', 'petal_length', 'petal_width', 'class']
+        moved_path = dataset_path + '.moved'
+        os.rename(dataset_path, moved_path)
+        try:
+            with mock.patch('utils.read_dataset', fail_read), mock.patch('routes.read_dataset', fail_read), \
+                    mock.patch('utils.read_data_file', fail_read), mock.patch('routes.read_data_file', fail_read), \
+                    mock.patch('pandas.read_csv', fail_read):
+                response = self.app.get('/generate')
+                self.assertEqual(response.status_code, 200)
+                for column in columns:
+                    self.assertIn(('name="' + column + '_' + str(dataset_id) + '"').encode(), response.data)
+                self.assertIn(b'title="Data type: float64"', response.data)
+                self.assertIn(('formaction="/leaderboard/' + str(dataset_id) + '"').encode(), response.data)
+
+                # the generation and leaderboard forms take their columns from the index too, the file is only
+                # checked to exist and is read by the job
+                os.rename(moved_path, dataset_path)
+                form = {name + '_' + str(dataset_id): value for name, value in [
+                    ('rows', '10'), ('epochs', '1'), ('synthetizer', 'gaussian_copula'),
+                    ('compare_gaussian_copula', 'Yes'), ('enforce_min_max_values', 'Yes'), ('enforce_rounding', 'Yes'),
+                    ('default_distribution', 'beta')] + [(column, 'norm') for column in columns]}
+                submitted = []
+                with mock.patch('routes.submit_job', lambda *args, **kwargs: submitted.append(args) or SimpleNamespace(id=0)):
+                    for url in ['/generate/', '/leaderboard/']:
+                        response = self.app.post(url + str(dataset_id), data=form)
+                        self.assertEqual(response.status_code, 302)
+                self.assertEqual(len(submitted), 2)
+                self.assertEqual(list(submitted[0][2]['numerical_distributions']), columns)
+                self.assertEqual(list(submitted[1][2]['synthesizers'][0]['numerical_distributions']), columns)
+        finally:
+            if os.path.exists(moved_path):
+                os.rename(moved_path, dataset_path)
+            self.app.post('/delete/' + str(dataset_id))
+
     # Functional test 1 - check if the home page is correctly loaded
     def test_func_1_home_page(self):
         response = self.app.get('/', follow_redirects=True)
@@ -0,0 +1,92 @@
+import json
+import os
+import sys
+import config as C
+
+# variables read by OpenMP, MKL, OpenBLAS, Accelerate and numexpr when they are loaded
+THREAD_VARIABLES = ['OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'VECLIB_MAXIMUM_THREADS',
+                    'NUMEXPR_NUM_THREADS']
+
+# threads given to the tasks of the current process, None until a limit is set
+process_threads = None
+
+
+# Return the cores shared by all the tasks of the deployment
+def get_thread_budget():
+    if C.THREAD_BUDGET:
+        return C.THREAD_BUDGET
+    # the cores this process may run on, fewer than the machine has inside a restricted container
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+# Return the tasks that can run at the same time, the jobs of the pools and the evaluation of each web worker
+def get_concurrent_tasks():
+    return C.WEB_WORKERS * (C.WORKERS + 1)
+
+
+# Return the threads of each concurrent task
+def get_task_threads():
+    return max(1, get_thread_budget() // get_concurrent_tasks())
+
+
+# Limit the threads used by torch and the numerical libraries in the current process
+def set_thread_limit(threads):
+    global process_threads
+
+    # libraries loaded later read the limit from the environment, child processes inherit it
+    for variable in THREAD_VARIABLES:
+        os.environ[variable] = str(threads)
+
+    # the libraries already loaded are changed directly
+    if 'torch' in sys.modules:
+        sys.modules['torch'].set_num_threads(threads)
+    if 'numexpr' in sys.modules:
+        sys.modules['numexpr'].set_num_threads(threads)
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(limits=threads)
+    except ImportError:
+        pass
+
+    process_threads = threads
+
+
+# Split the threads of the current process among the processes of a pool it starts
+def get_pool_threads(processes):
+    threads = process_threads or get_task_threads()
+    return max(1, threads // processes)
+
+
+# Return the pool processes a job of the given kind runs at most and the threads of each one. The leaderboard
+# compares its synthesizers in a pool and a generate job samples its batches in a pool, each process of the pool
+# gets at least one thread
+def get_job_allocation(kind, params):
+    if kind == 'leaderboard':
+        processes = max(1, min(len(params.get('synthesizers', [])), C.LEADERBOARD_WORKERS))
+    else:
+        processes = max(1, C.SAMPLE_WORKERS)
+    return processes, max(1, get_task_threads() // processes)
+
+
+# Return the thread allocation of the deployment and the threads of the given running jobs
+def get_thread_allocation(running_jobs=()):
+    task_threads = get_task_threads()
+    jobs = []
+    for job in running_jobs:
+        processes, threads = get_job_allocation(job.kind, json.loads(job.params or '{}'))
+        # a generate job fits in its own process with all its threads before it samples in the pool
+        jobs.append({'id': job.id, 'kind': job.kind, 'pid': job.pid, 'processes': processes,
+                     'process_threads': threads, 'threads': max(task_threads, processes * threads)})
+    return {
+        'budget': get_thread_budget(),
+        'web_workers': C.WEB_WORKERS,
+        'job_workers': C.WORKERS,
+        'leaderboard_workers': C.LEADERBOARD_WORKERS,
+        'sample_workers': C.SAMPLE_WORKERS,
+        'concurrent_tasks': get_concurrent_tasks(),
+        'task_threads': task_threads,
+        'web_process_threads': process_threads,
+        'running_jobs': jobs,
+    }
@@ -0,0 +1,171 @@
+from contextlib import contextmanager
+import ctgan.synthesizers.ctgan as ctgan_module
+import ctgan.synthesizers.tvae as tvae_module
+import numpy as np
+import os
+import sys
+import time
+import config as C
+
+# ctgan modules whose fit loops iterate over tqdm(range(epochs))
+TRAINING_MODULES = [module for module in [ctgan_module, tvae_module] if hasattr(module, 'tqdm')]
+
+
+# Iterator given to the ctgan fit loops instead of tqdm, it asks the control before each epoch
+class EpochIterator:
+    def __init__(self, control, iterable):
+        self.control = control
+        self.epochs = len(iterable)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        # the caller is the fit method, its local variables hold the networks and optimizers
+        return self.control.next_epoch(sys._getframe(1).f_locals, self.epochs)
+
+    def set_description(self, description):
+        pass
+
+
+# Stops the training on a loss plateau or when the time budget runs out, and saves checkpoints
+# that the next fit of the same model resumes from
+class TrainingControl:
+    def __init__(self, checkpoint_path, patience=None, min_delta=C.EARLY_STOPPING_MIN_DELTA, max_seconds=None,
+                 checkpoint_every=C.CHECKPOINT_EVERY_EPOCHS):
+        self.checkpoint_path = checkpoint_path
+        self.patience = patience
+        self.min_delta = min_delta
+        self.max_seconds = max_seconds
+        self.checkpoint_every = checkpoint_every
+
+        self.model = None
+        self.components = None
+        self.epoch = None
+        self.completed_epochs = 0
+        self.start_time = None
+        self.best_loss = None
+        self.epochs_since_best = 0
+        self.resumed_from_epoch = None
+        self.stopped = None
+
+    # Return the index of the next epoch to train, or stop the loop
+    def next_epoch(self, fit_locals, epochs):
+        if self.epoch is None:
+            self.model = fit_locals['self']
+            self.components = get_components(fit_locals)
+            self.start_time = time.monotonic()
+            self.epoch = self.resume()
+        else:
+            self.end_epoch()
+            if self.stopped is not None:
+                raise StopIteration
+            self.epoch += 1
+
+        if self.epoch >= epochs:
+            raise StopIteration
+        return self.epoch
+
+    # Track the loss of the epoch that just ended and decide if the training goes on
+    def end_epoch(self):
+        self.completed_epochs = self.epoch + 1
+        loss = get_epoch_loss(self.model.loss_values)
+        if loss is None:
+            pass
+        elif self.best_loss is None or loss < self.best_loss - self.min_delta * abs(self.best_loss):
+            self.best_loss = loss
+            self.epochs_since_best = 0
+        else:
+            self.epochs_since_best += 1
+
+        if self.patience is not None and self.epochs_since_best >= self.patience:
+            self.stopped = 'plateau'
+        elif self.max_seconds is not None and time.monotonic() - self.start_time >= self.max_seconds:
+            # the checkpoint lets a later run continue the training
+            self.stopped = 'time_budget'
+            self.save_checkpoint()
+        elif (self.epoch + 1) % self.checkpoint_every == 0:
+            self.save_checkpoint()
+
+    # Save the state of the networks and optimizers after the current epoch
+    def save_checkpoint(self):
+        import torch
+
+        checkpoint = {
+            'epoch': self.epoch,
+            'states': {name: component.state_dict() for name, component in self.components.items()},
+            'loss_values': self.model.loss_values,
+            'best_loss': self.best_loss,
+            'epochs_since_best': self.epochs_since_best,
+        }
+        tmp_path = self.checkpoint_path + '.' + str(os.getpid()) + '.tmp'
+        torch.save(checkpoint, tmp_path)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    # Load the last checkpoint into the new networks and return the epoch to continue from
+    def resume(self):
+        import torch
+
+        if self.checkpoint_path is None or not os.path.exists(self.checkpoint_path):
+            return 0
+
+        checkpoint = torch.load(self.checkpoint_path, map_location='cpu')
+        try:
+            for name, component in self.components.items():
+                component.load_state_dict(checkpoint['states'][name])
+        except (KeyError, RuntimeError, ValueError):
+            # the checkpoint belongs to networks of another shape, the training starts again
+            return 0
+
+        self.model.loss_values = checkpoint['loss_values']
+        self.best_loss = checkpoint['best_loss']
+        self.epochs_since_best = checkpoint['epochs_since_best']
+        self.resumed_from_epoch = checkpoint['epoch'] + 1
+        self.completed_epochs = self.resumed_from_epoch
+        return self.resumed_from_epoch
+
+    # Return the information about the training that is stored with the fit
+    def get_info(self):
+        return {'epochs_run': self.completed_epochs, 'stopped': self.stopped,
+                'resumed_from_epoch': self.resumed_from_epoch}
+
+
+# Return the networks and optimizers of a fit, the local variables and the attributes of the model
+def get_components(fit_locals):
+    components = {}
+    for name, value in fit_locals.items():
+        if name != 'self' and hasattr(value, 'state_dict') and hasattr(value, 'load_state_dict'):
+            components[name] = value
+    for name, value in vars(fit_locals['self']).items():
+        if hasattr(value, 'state_dict') and hasattr(value, 'load_state_dict'):
+            components['self.' + name] = value
+    return components
+
+
+# Return the loss of the last epoch, the generator loss of CTGAN or the mean batch loss of TVAE
+def get_epoch_loss(loss_values):
+    if loss_values is None or len(loss_values) == 0:
+        return None
+    if 'Generator Loss' in loss_values.columns:
+        return float(loss_values['Generator Loss'].iloc[-1])
+    last_epoch = loss_values['Epoch'].iloc[-1]
+    return float(loss_values[loss_values['Epoch'] == last_epoch]['Loss'].astype(float).mean())
+
+
+# Run the fits inside the block under the given training control
+@contextmanager
+def controlled_training(control):
+    import torch
+
+    # the same seed rebuilds the same data transformer, so a resumed fit has networks of the same shape
+    np.random.seed(C.FIT_SEED)
+    torch.manual_seed(C.FIT_SEED)
+
+    originals = [module.tqdm for module in TRAINING_MODULES]
+    for module in TRAINING_MODULES:
+        module.tqdm = lambda iterable, *args, **kwargs: EpochIterator(control, iterable)
+    try:
+        yield control
+    finally:
+        for module, original in zip(TRAINING_MODULES, originals):
+            module.tqdm = original
@@ -0,0 +1,392 @@
+import codecs
+import csv
+import hashlib
+import io
+import itertools
+import operator
+import os
+import re
+from compression import decompress_stream, DECOMPRESSION_ERRORS
+import config as C
+
+# characters allowed in the headers besides letters and digits
+HEADER_CHARACTERS = '.-:,_'
+
+# values read as missing by pandas, they do not change the dtype inferred for a column
+MISSING_VALUES = {'', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN', '<NA>',
+                  'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'}
+TRUE_VALUES = ['True', 'true', 'TRUE']
+FALSE_VALUES = ['False', 'false', 'FALSE']
+BOOLEAN_VALUES = set(TRUE_VALUES + FALSE_VALUES)
+# numbers as pandas reads them: with spaces around them and a sign, but no underscores or hexadecimal digits
+INTEGER_PATTERN = re.compile(r'[ \t]*[+-]?[0-9]+[ \t]*')
+FLOAT_PATTERN = re.compile(r'[ \t]*[+-]?([0-9]+\.?[0-9]*([eE][+-]?[0-9]+)?|\.[0-9]+([eE][+-]?[0-9]+)?|inf|infinity)[ \t]*',
+                           re.IGNORECASE)
+# ranges of the integer dtypes, wider integers are objects
+INTEGER_RANGES = [('int64', -2 ** 63, 2 ** 63 - 1), ('uint64', 0, 2 ** 64 - 1)]
+
+
+# Raised by the stream of an upload read in parts when the bytes that follow did not arrive yet
+class UploadPending(Exception):
+    pass
+
+
+# Error of an uploaded file, with the line of the first bad row when there is one
+class UploadError(ValueError):
+    def __init__(self, error, line=None):
+        super().__init__(error)
+        self.error = error
+        self.line = line
+
+    def __str__(self):
+        if self.line is None:
+            return self.error
+        return 'Line ' + str(self.line) + ': ' + self.error
+
+    # Return the error as a dictionary
+    def get_report(self):
+        return {'error': self.error, 'line': self.line}
+
+
+# Infer the dtype of each column from blocks of rows, like pandas does when reading the whole file
+class DtypeInference:
+    def __init__(self, columns):
+        self.columns = get_unique_names(columns)
+        self.has_missing = [False] * len(columns)
+        self.has_values = [False] * len(columns)
+        # the smallest and largest value of each integer column
+        self.ranges = [None] * len(columns)
+        # the kinds each column can still be, a column that can only be an object is not checked anymore
+        self.kinds = [{'bool', 'int', 'float'} for _ in columns]
+        self.pending = list(range(len(columns)))
+
+    # Add a block of rows, each distinct value of a column is only checked once
+    def add(self, rows):
+        for i in self.pending:
+            values = set(map(operator.itemgetter(i), rows))
+            if values & MISSING_VALUES:
+                self.has_missing[i] = True
+                values -= MISSING_VALUES
+            if not values:
+                continue
+            self.has_values[i] = True
+
+            kinds = self.kinds[i]
+            if 'bool' in kinds and not values <= BOOLEAN_VALUES:
+                kinds.discard('bool')
+            if 'int' in kinds:
+                if all(map(INTEGER_PATTERN.fullmatch, values)):
+                    numbers = list(map(int, values))
+                    low, high = self.ranges[i] or (numbers[0], numbers[0])
+                    self.ranges[i] = (min(low, *numbers), max(high, *numbers))
+                else:
+                    kinds.discard('int')
+            if 'float' in kinds and 'int' not in kinds and not all(map(FLOAT_PATTERN.fullmatch, values)):
+                kinds.discard('float')
+        self.pending = [i for i in self.pending if self.kinds[i]]
+
+    # Return the dtype of the column with the given index
+    def get_dtype(self, i):
+        kinds = self.kinds[i]
+        if not self.has_values[i]:
+            return 'float64'
+        if 'bool' in kinds:
+            # missing values turn a boolean column into objects
+            return 'object' if self.has_missing[i] else 'bool'
+        if 'int' in kinds:
+            low, high = self.ranges[i]
+            dtypes = [dtype for dtype, dtype_low, dtype_high in INTEGER_RANGES if dtype_low <= low and high <= dtype_high]
+            if not dtypes or self.has_missing[i] and dtypes[0] != 'int64':
+                # the integers wider than the dtypes keep their digits as objects
+                return 'object'
+            # and an integer column into floats
+            return 'float64' if self.has_missing[i] else dtypes[0]
+        if 'float' in kinds:
+            return 'float64'
+        return 'object'
+
+    # Return the name and dtype of each column, the objects of a boolean column with missing values are booleans
+    def get_columns(self):
+        columns = [{'name': name, 'dtype': self.get_dtype(i)} for i, name in enumerate(self.columns)]
+        for i, column in enumerate(columns):
+            if column['dtype'] == 'object' and 'bool' in self.kinds[i] and self.has_values[i]:
+                column['values'] = 'bool'
+        return columns
+
+
+# Return the names of the columns as pandas reads them, the empty ones are unnamed and the repeated ones numbered
+def get_unique_names(columns):
+    names = []
+    for i, column in enumerate(columns):
+        name = column or 'Unnamed: ' + str(i)
+        count = 0
+        while name in names:
+            count += 1
+            name = (column or 'Unnamed: ' + str(i)) + '.' + str(count)
+        names.append(name)
+    return names
+
+
+# Return the options of the csv reader of pyarrow that reads an upload with the given names and dtypes of its
+# columns, or infers them if they are not given. The values read as missing and as booleans are the ones the
+# dtypes are inferred with
+def get_csv_options(columns=None):
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+
+    # the numbers are read as text and parsed by parse_numbers
+    types = {'int64': pa.string(), 'uint64': pa.string(), 'float64': pa.string(), 'bool': pa.bool_(),
+             'object': pa.string()}
+    read_options = pa_csv.ReadOptions()
+    convert_options = pa_csv.ConvertOptions(null_values=sorted(MISSING_VALUES), strings_can_be_null=True,
+                                            true_values=TRUE_VALUES, false_values=FALSE_VALUES)
+    if columns is not None:
+        # the header is skipped, the names of the columns are the unique ones
+        read_options = pa_csv.ReadOptions(skip_rows=1, column_names=[column['name'] for column in columns])
+        convert_options.column_types = {column['name']: types[column.get('values', column['dtype'])]
+                                        for column in columns}
+    # the quoted values can have line breaks
+    parse_options = pa_csv.ParseOptions(newlines_in_values=True)
+    return {'read_options': read_options, 'parse_options': parse_options, 'convert_options': convert_options}
+
+
+# Return the batch read with the options of get_csv_options with its numbers parsed as pandas does: the spaces
+# around them and their plus signs are removed before they are cast
+def parse_numbers(batch, columns):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    arrays = []
+    for array, column in zip(batch.columns, columns):
+        if column['dtype'] in ['int64', 'uint64', 'float64']:
+            array = pc.replace_substring_regex(pc.utf8_trim_whitespace(array), r'^\+', '').cast(column['dtype'])
+        arrays.append(array)
+    return pa.RecordBatch.from_arrays(arrays, names=batch.schema.names)
+
+
+# Binary stream that copies each chunk to the output file and the hash, if there is one, as it is read
+class CopyingReader(io.RawIOBase):
+    def __init__(self, stream, output, sha):
+        self.stream = stream
+        self.output = output
+        self.sha = sha
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        try:
+            chunk = self.stream.read(len(buffer))
+        except DECOMPRESSION_ERRORS as e:
+            raise UploadError('The file could not be decompressed: {}.'.format(e))
+        self.output.write(chunk)
+        if self.sha is not None:
+            self.sha.update(chunk)
+        buffer[:len(chunk)] = chunk
+        return len(chunk)
+
+
+# Return the line of the first byte of the file that is not UTF-8, the text is decoded ahead of the rows read
+def get_decode_error_line(path):
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    lines = 0
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(C.UPLOAD_CHUNK_BYTES), b''):
+            try:
+                decoder.decode(chunk)
+            except UnicodeDecodeError as e:
+                # the bytes of the error start with the incomplete character kept from the previous chunk
+                return lines + e.object[:e.start].count(b'\n') + 1
+            lines += chunk.count(b'\n')
+    return lines + 1
+
+
+# Return the last line of the row with the given index in the csv file, counting the header and the blank lines
+def get_row_line(path, index):
+    with open(path, newline='', encoding='utf-8') as file:
+        reader = csv.reader(file)
+        for _ in itertools.islice(reader, index + 1):
+            pass
+        return reader.line_num
+
+
+# Sniff the sample of the first lines once: the file must have headers and be separated by commas
+def check_dialect(sample):
+    sniffer = csv.Sniffer()
+    try:
+        has_header = sniffer.has_header(sample)
+        delimiter = sniffer.sniff(sample).delimiter
+    except csv.Error:
+        # a sample the sniffer cannot read, because of a bad row, is left to the check of each row
+        if ',' in sample.split('\n', 1)[0]:
+            return
+        raise UploadError('The file must be separated by commas.')
+    if not has_header:
+        raise UploadError('The file must have headers.')
+    if delimiter != ',':
+        raise UploadError('The file must be separated by commas.')
+
+
+# Point of the csv of an upload its check stopped at, the end of its last complete row: the bytes and lines up to
+# it, the rows read with the header and the blank lines, the rows of values, and the dtypes inferred from them.
+# The checksum of the csv is set once all of it is checked
+class UploadCheck:
+    def __init__(self):
+        self.size = 0
+        self.lines = 0
+        self.records = 0
+        self.rows = 0
+        self.inference = None
+        self.pending = False
+        self.checksum = None
+
+    # Iterate over the complete rows of the reader, moving the check to the end of each one. The rows end
+    # when the stream waits for the bytes that did not arrive yet
+    def read_rows(self, rows_reader, counter):
+        self.pending = False
+        try:
+            for row in rows_reader:
+                self.size, self.lines = counter.size, counter.lines
+                yield row
+        except UploadPending:
+            self.pending = True
+
+    # Return the checksum, size, rows and columns of the checked csv
+    def get_info(self, size):
+        return {'checksum': self.checksum, 'size': size, 'rows': self.rows, 'columns': self.inference.get_columns()}
+
+
+# Iterator over the lines of a text that counts the lines and the bytes of the ones read
+class LineCounter:
+    def __init__(self, lines, size=0, count=0):
+        self.lines_iter = lines
+        self.size = size
+        self.lines = count
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = next(self.lines_iter)
+        self.size += len(line) if line.isascii() else len(line.encode('utf-8'))
+        self.lines += 1
+        return line
+
+
+# Check the uploaded csv stream from the point the check stopped at, decompressing it with the given
+# compression: sniff it, check its headers and the number of values of every row and infer the dtype of each
+# column, appending the csv to the given path at the same time. A stream read in parts raises UploadPending when
+# it reaches the bytes that did not arrive yet, the check then stops at the end of the last complete row and
+# goes on from there with the same path. Returns whether the whole stream was checked, raises UploadError at
+# the first bad line
+def check_upload(stream, path, check, compression=None, sha=None):
+    with open(path, 'r+b' if check.size else 'wb') as output:
+        # the bytes read after the last complete row are read again
+        output.truncate(check.size)
+        output.seek(check.size)
+        # the lines keep their endings so the csv reader finds the line breaks inside quoted values
+        reader = CopyingReader(decompress_stream(stream, compression), output, sha)
+        text = io.TextIOWrapper(io.BufferedReader(reader, C.UPLOAD_CHUNK_BYTES), encoding='utf-8', newline='')
+        lines = iter(text)
+        try:
+            if check.inference is None:
+                first_lines = list(itertools.islice(lines, C.UPLOAD_SNIFF_LINES))
+                check_dialect(''.join(first_lines))
+
+                header_line = first_lines[0].strip()
+                if not all(c.isalnum() or c in HEADER_CHARACTERS for c in header_line):
+                    raise UploadError('The headers must not contain special characters.', 1)
+                lines = itertools.chain(first_lines, lines)
+
+            counter = LineCounter(lines, check.size, check.lines)
+            rows_reader = csv.reader(counter)
+            if check.inference is None:
+                check.inference = DtypeInference(next(rows_reader))
+                check.records = 1
+                check.size, check.lines = counter.size, counter.lines
+            columns = len(check.inference.columns)
+            rows = check.read_rows(rows_reader, counter)
+            # the rows are checked a block at a time
+            for block in iter(lambda: list(itertools.islice(rows, C.UPLOAD_BLOCK_ROWS)), []):
+                lengths = set(map(len, block))
+                if not lengths <= {0, columns}:
+                    index = next(i for i, row in enumerate(block) if row and len(row) != columns)
+                    output.flush()
+                    raise UploadError('The row has {} values but the header has {} columns.'.format(
+                        len(block[index]), columns), get_row_line(path, check.records + index))
+                check.records += len(block)
+                # blank lines are skipped, as pandas does
+                if 0 in lengths:
+                    block = [row for row in block if row]
+                check.inference.add(block)
+                check.rows += len(block)
+        except UnicodeDecodeError:
+            output.flush()
+            raise UploadError('The file must be encoded in UTF-8.', get_decode_error_line(path))
+        except csv.Error as e:
+            raise UploadError('The row could not be read: {}.'.format(e), counter.lines)
+        except UploadPending:
+            # the sample of the first lines or the header did not arrive yet
+            return False
+
+    if check.pending:
+        return False
+    if check.rows == 0:
+        raise UploadError('The file must have at least one row.', 2)
+    return True
+
+
+# Read the uploaded csv stream once, decompressing it with the given compression, check it and write it to the
+# given path at the same time. Returns the checksum, size, rows and columns of the csv, raises UploadError at the
+# first bad line
+def validate_upload(stream, path, compression=None):
+    tmp_path = path + '.' + str(os.getpid()) + '.tmp'
+    sha = hashlib.sha256()
+    check = UploadCheck()
+    try:
+        check_upload(stream, tmp_path, check, compression, sha)
+        check.checksum = sha.hexdigest()
+        size = os.path.getsize(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return check.get_info(size)
+
+
+# Store the checked csv of an upload as a new dataset of the user. Its files are shared with the datasets of the
+# same content, and its schema and metadata are copied from them or detected once. Raises UploadError if the csv
+# cannot be read
+def create_dataset(user_id, name, csv_path, upload_info):
+    from app import db
+    from models import Dataset
+    from blobs import acquire_blob, store_blob
+    from utils import copy_dataset_index, index_dataset_schema, detect_dataset_metadata
+
+    # the files are stored once for each content, an upload of a stored content points at them
+    checksum = upload_info['checksum']
+    blob = acquire_blob(checksum)
+    if blob is not None:
+        os.remove(csv_path)
+    else:
+        # convert the csv once to the columnar file read by the generate and evaluate pages
+        try:
+            # the dtypes inferred while the upload was checked
+            blob = store_blob(checksum, csv_path, upload_info['columns'])
+        except Exception:
+            if os.path.exists(csv_path):
+                os.remove(csv_path)
+            raise UploadError('The file could not be read as a csv file.')
+
+    dataset = Dataset(name=name, path=blob.path, csv_path=blob.csv_path, checksum=checksum, user_id=user_id)
+    db.session.add(dataset)
+    db.session.commit()
+
+    # index the schema and detect the metadata once, the generate and evaluate pages reuse them,
+    # and the datasets with the same content copy them
+    if not copy_dataset_index(dataset):
+        index_dataset_schema(dataset, file_size=upload_info['size'], columns=upload_info['columns'],
+                             row_count=upload_info['rows'])
+        detect_dataset_metadata(dataset)
+    return dataset
@@ -1,25 +1,157 @@
 import os
 import numpy as np
-from models import Dataset, User
+from models import Dataset, User, Job, Upload
 from app import bcrypt
+from compression import get_uncompressed_name, get_compressed_name, open_data_file, EXTENSIONS
 import config as C
 import csv
+import hashlib
+import json
 
 
 # Create the system directories
 def build_system():
     if not os.path.exists(C.DATASET_PATH):
         os.makedirs(C.DATASET_PATH)
+    if not os.path.exists(C.BLOB_PATH):
+        os.makedirs(C.BLOB_PATH)
     if not os.path.exists(C.SYNTHETIC_PATH):
         os.makedirs(C.SYNTHETIC_PATH)
     if not os.path.exists(C.PLOT_PATH):
         os.makedirs(C.PLOT_PATH)
+    if not os.path.exists(C.MODEL_PATH):
+        os.makedirs(C.MODEL_PATH)
+    if not os.path.exists(C.CHUNK_PATH):
+        os.makedirs(C.CHUNK_PATH)
+
+
+# Add to the existing tables the columns created after the database file and drop the unique constraints removed
+def upgrade_database():
+    from app import db
+    from sqlalchemy import UniqueConstraint, inspect, text
+    from sqlalchemy.exc import OperationalError
+
+    inspector = inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        existing = [column['name'] for column in inspector.get_columns(table.name)]
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                try:
+                    with db.engine.begin() as connection:
+                        connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                except OperationalError:
+                    # another worker added the column at the same time
+                    pass
+
+    # SQLite cannot drop a constraint or change the primary key, the tables with unique columns the models
+    # no longer have, or whose ids the models no longer let be reused, are rebuilt
+    inspector = inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        unique = {tuple(constraint['column_names']) for constraint in inspector.get_unique_constraints(table.name)}
+        expected = {tuple(column.name for column in constraint.columns) for constraint in table.constraints
+                    if isinstance(constraint, UniqueConstraint)}
+        with db.engine.connect() as connection:
+            create = connection.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                                        {'name': table.name}).scalar()
+        autoincrement = table.dialect_options['sqlite']['autoincrement']
+        if unique - expected or (autoincrement and 'AUTOINCREMENT' not in create.upper()):
+            try:
+                rebuild_table(table)
+            except OperationalError:
+                # another worker rebuilt the table at the same time
+                pass
+
+
+# Create the table again from its model and copy its rows, in a single transaction
+def rebuild_table(table):
+    from app import db
+    from sqlalchemy import text
+    from sqlalchemy.schema import CreateTable
+
+    new_name = table.name + '_new'
+    create = str(CreateTable(table).compile(dialect=db.engine.dialect)).replace(
+        f'CREATE TABLE {table.name} ', f'CREATE TABLE {new_name} ', 1)
+    columns = ', '.join(column.name for column in table.columns)
+    with db.engine.begin() as connection:
+        connection.execute(text(create))
+        connection.execute(text(f'INSERT INTO {new_name} ({columns}) SELECT {columns} FROM {table.name}'))
+        connection.execute(text(f'DROP TABLE {table.name}'))
+        connection.execute(text(f'ALTER TABLE {new_name} RENAME TO {table.name}'))
 
 
 # Get the regression line of the dataset
 def get_regression_line(x, y):
-    slope, intercept = np.polyfit(x, y, 1)
-    return slope, intercept
+    lines = get_regression_lines({'x': x, 'y': y}, [('x', 'y')])
+    return lines[('x', 'y')]
+
+
+# Get the least squares line of each pair of columns of the data, as a table from (x column, y column)
+# to (slope, intercept). All the pairs come from the same sums over the rows, each pair only uses the rows
+# where both of its columns have a value, and a pair whose x column is constant gets NaN
+def get_regression_lines(data, column_pairs):
+    if not column_pairs:
+        return {}
+    column_pairs = [tuple(pair) for pair in column_pairs]
+    columns = list(dict.fromkeys(column for pair in column_pairs for column in pair))
+
+    values = np.column_stack([np.asarray(data[column], dtype=float) for column in columns])
+    present = ~np.isnan(values)
+    # centered on the column means, so the sums of squares do not lose precision on large values
+    centers = np.nansum(values, axis=0) / np.maximum(present.sum(axis=0), 1)
+    values = np.where(present, values - centers, 0.0)
+    present = present.astype(float)
+
+    # element [i, j] sums column i over the rows where column j has a value, and the other way for the transpose
+    counts = present.T @ present
+    sums = values.T @ present
+    squares = (values ** 2).T @ present
+    products = values.T @ values
+
+    index = {column: i for i, column in enumerate(columns)}
+    lines = {}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for column1, column2 in column_pairs:
+            i, j = index[column1], index[column2]
+            n = counts[i, j]
+            mean_x, mean_y = sums[i, j] / n, sums[j, i] / n
+            variance = squares[i, j] / n - mean_x ** 2
+            covariance = products[i, j] / n - mean_x * mean_y
+            slope = covariance / variance if n > 1 and variance > 0 else np.nan
+            intercept = mean_y + centers[j] - slope * (mean_x + centers[i])
+            lines[(column1, column2)] = (float(slope), float(intercept))
+    return lines
+
+
+# Get the statistics of the evaluation page: the mean and standard deviation of each numerical column, the mode of
+# each categorical column, and the covariance, correlation and regression line of each pair of numerical columns,
+# in the real and the synthetic data. They are stored with the evaluation, so the page is shown without the files
+def get_evaluation_statistics(real_data, synthetic_data, column_pairs):
+    data = {'real': real_data, 'synthetic': synthetic_data}
+    lines = {name: get_regression_lines(frame, column_pairs) for name, frame in data.items()}
+
+    columns = []
+    for column in real_data.columns:
+        statistics = {'dtype': str(real_data[column].dtype)}
+        for name, frame in data.items():
+            if statistics['dtype'] in ['int64', 'float64']:
+                statistics[name] = {'mean': float(frame[column].mean()), 'std': float(frame[column].std())}
+            elif statistics['dtype'] == 'object':
+                mode = frame[column].mode()
+                value = mode.iloc[0] if len(mode) else None
+                statistics[name] = {'mode': value.item() if hasattr(value, 'item') else value}
+        columns.append((column, statistics))
+
+    pairs = []
+    for column1, column2 in column_pairs:
+        statistics = {}
+        for name, frame in data.items():
+            slope, intercept = lines[name][(column1, column2)]
+            statistics[name] = {'covariance': float(frame[column1].cov(frame[column2])),
+                                'correlation': float(frame[column1].corr(frame[column2])),
+                                'slope': slope, 'intercept': intercept}
+        pairs.append(statistics)
+    return {'columns': columns, 'pairs': pairs}
 
 
 #  Return the dataset with the given id
@@ -27,6 +159,230 @@ def load_dataset(dataset_id):
     return Dataset.query.get(int(dataset_id))
 
 
+#  Return the job with the given id
+def load_job(job_id):
+    return Job.query.get(int(job_id))
+
+
+#  Return the chunked upload with the given id
+def load_upload(upload_id):
+    return Upload.query.get(int(upload_id))
+
+
+# Return the sha256 of the file in the given path
+def get_file_checksum(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+# Return the checksum of the dataset, computing it for datasets uploaded before it was stored
+def get_dataset_checksum(dataset):
+    from app import db
+
+    if dataset.checksum is None:
+        dataset.checksum = get_file_checksum(dataset.path)
+        db.session.commit()
+    return dataset.checksum
+
+
+# Convert the uploaded csv to the columnar file read by the application, with the given dtypes of its columns
+# or the dtypes inferred here
+def convert_to_columnar(csv_path, columnar_path, columns=None):
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+    from uploads import get_csv_options, parse_numbers
+
+    # the csv is read and written batch by batch, with the dtypes inferred while the upload was checked
+    # so each column gets a single one
+    reader = pa_csv.open_csv(csv_path, **get_csv_options(columns))
+    schema = reader.schema
+    if columns is not None:
+        # the numbers are read as text and parsed in each batch, the schema is the one of a parsed empty batch
+        schema = parse_numbers(pa.RecordBatch.from_pylist([], schema=schema), columns).schema
+    compression = None if C.COLUMNAR_COMPRESSION == 'uncompressed' else C.COLUMNAR_COMPRESSION
+    tmp_path = columnar_path + '.' + str(os.getpid()) + '.tmp'
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, schema, options=pa.ipc.IpcWriteOptions(compression=compression)) as writer:
+            for batch in reader:
+                writer.write_batch(batch if columns is None else parse_numbers(batch, columns))
+    os.replace(tmp_path, columnar_path)
+
+
+# Read the data of a dataset file, only the given columns and the first nrows rows if they are given
+def read_data_file(path, columns=None, nrows=None):
+    import pandas as pd
+
+    # datasets uploaded before the columnar storage and the synthetic data are csv files, maybe compressed
+    if get_uncompressed_name(path).endswith('.csv'):
+        with open_data_file(path) as file:
+            data = pd.read_csv(file, usecols=columns, nrows=nrows)
+        return data if columns is None else data[list(columns)]
+
+    from pyarrow import feather
+    # the memory-mapped table is only copied for the selected columns and rows
+    table = feather.read_table(path, columns=columns, memory_map=True)
+    if columns is not None:
+        # the columns are read in the order of the file, return them in the order asked
+        table = table.select(list(columns))
+    if nrows is not None:
+        table = table.slice(0, nrows)
+    return table.to_pandas()
+
+
+# Iterate over the data of a dataset file in batches of rows, only the given columns if they are given
+def iter_data_batches(path, columns=None):
+    import pandas as pd
+
+    if get_uncompressed_name(path).endswith('.csv'):
+        with open_data_file(path) as file:
+            for batch in pd.read_csv(file, usecols=columns, chunksize=C.SAMPLE_BATCH_ROWS):
+                yield batch if columns is None else batch[list(columns)]
+        return
+
+    import pyarrow as pa
+    # the record batches are read from the memory-mapped file one at a time
+    with pa.memory_map(path) as source:
+        reader = pa.ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            if columns is not None:
+                batch = batch.select(list(columns))
+            yield batch.to_pandas()
+
+
+# Return the path of the synthetic file of the dataset, with the extension of the given compression
+def get_synthetic_path(dataset, compression=None):
+    from app import app
+
+    name = get_compressed_name(get_uncompressed_name(dataset.name), compression)
+    return os.path.join(app.root_path, C.SYNTHETIC_PATH + str(dataset.id) + '_s_' + name)
+
+
+# Return the paths of the synthetic files the dataset can have, one for each compression
+def get_synthetic_paths(dataset):
+    return [get_synthetic_path(dataset, compression) for compression in [None] + list(EXTENSIONS)]
+
+
+# Return the path of the synthetic file of the dataset, whatever its compression, or None if there is none
+def find_synthetic_path(dataset):
+    return next((path for path in get_synthetic_paths(dataset) if os.path.exists(path)), None)
+
+
+# Read the data of the dataset
+def read_dataset(dataset, columns=None, nrows=None):
+    return read_data_file(dataset.path, columns, nrows)
+
+
+# Delete the datasets that do not have a corresponding user or whose file does not exist
+def remove_stale_datasets():
+    from app import db
+
+    for dataset in Dataset.query.all():
+        if not db.session.get(User, dataset.user_id) or not os.path.exists(dataset.path):
+            db.session.delete(dataset)
+            remove_dataset_files(dataset)
+    db.session.commit()
+
+
+# Remove the columnar file of the dataset and its csv if it was kept, the files shared with other datasets
+# are only removed with the last of them
+def remove_dataset_files(dataset):
+    from blobs import release_blob
+    from evaluation import remove_evaluations
+
+    if not release_blob(dataset):
+        for path in [dataset.path, dataset.csv_path]:
+            if path is not None and os.path.exists(path):
+                os.remove(path)
+    remove_evaluations(dataset.id)
+
+
+# Store the column names, dtypes, number of rows and file size of the dataset in the database
+def index_dataset_schema(dataset, data=None, file_size=None, columns=None, row_count=None):
+    from app import db
+
+    # the columns and rows of an upload are known from its check, the file is not read again
+    if columns is None:
+        if data is None:
+            data = read_dataset(dataset)
+        columns = [{'name': str(column), 'dtype': str(data[column].dtype)} for column in data.columns]
+        row_count = len(data)
+
+    dataset.schema = json.dumps(columns)
+    dataset.row_count = row_count
+    dataset.file_size = file_size if file_size is not None else os.path.getsize(dataset.path)
+    db.session.commit()
+
+
+# Copy the schema index and the metadata of another dataset that points at the same files,
+# returns False if there is none with them
+def copy_dataset_index(dataset):
+    from app import db
+
+    source = Dataset.query.filter(Dataset.path == dataset.path, Dataset.id != dataset.id,
+                                  Dataset.schema.isnot(None), Dataset.sdv_metadata.isnot(None)).first()
+    if source is None:
+        return False
+
+    for field in ['schema', 'row_count', 'file_size', 'sdv_metadata', 'metadata_signature']:
+        setattr(dataset, field, getattr(source, field))
+    db.session.commit()
+    return True
+
+
+# Return the indexed columns of the dataset, indexing the datasets uploaded before the schema index
+def get_dataset_schema(dataset):
+    if dataset.schema is None:
+        index_dataset_schema(dataset)
+    return json.loads(dataset.schema)
+
+
+# Return the indexed columns of the dataset with the sdtype of the stored metadata
+def get_dataset_columns(dataset):
+    sdtypes = json.loads(dataset.sdv_metadata)['columns'] if dataset.sdv_metadata else {}
+    return [dict(column, sdtype=sdtypes.get(column['name'], {}).get('sdtype')) for column in get_dataset_schema(dataset)]
+
+
+# Return a cheap signature of the file that changes whenever the file is rewritten
+def get_file_signature(path):
+    stat = os.stat(path)
+    return str(stat.st_size) + ':' + str(stat.st_mtime_ns)
+
+
+# Detect the SDV metadata of the dataset and store it as json in the database
+def detect_dataset_metadata(dataset, data=None):
+    from app import db
+    from sdv.metadata import SingleTableMetadata
+
+    if data is None:
+        data = read_dataset(dataset)
+
+    metadata = SingleTableMetadata()
+    metadata.detect_from_dataframe(data)
+
+    dataset.sdv_metadata = json.dumps(metadata.to_dict())
+    dataset.metadata_signature = get_file_signature(dataset.path)
+    db.session.commit()
+    return metadata
+
+
+# Return the SDV metadata of the dataset as a dictionary, detecting it again if the file changed
+def get_dataset_metadata_dict(dataset, data=None):
+    if dataset.sdv_metadata is None or dataset.metadata_signature != get_file_signature(dataset.path):
+        return detect_dataset_metadata(dataset, data).to_dict()
+    return json.loads(dataset.sdv_metadata)
+
+
+# Return the SingleTableMetadata of the dataset
+def get_dataset_metadata(dataset, data=None):
+    from sdv.metadata import SingleTableMetadata
+
+    return SingleTableMetadata.load_from_dict(get_dataset_metadata_dict(dataset, data))
+
+
 # Return the user with the given id
 def authenticate_user(username, password):
     user = User.query.filter_by(username=username).first()
@@ -77,3 +433,65 @@ def separate_with_comma(file):
     dialect = sniffer.sniff(sample)
 
     return dialect.delimiter == ','
+
+
+# Parse the options of the generate form of the dataset with the given id
+def get_generation_params(form, id, columns):
+    # dictionary to parse the yes/no values from the form
+    yes_no_parser = {'Yes': True, 'No': False}
+
+    params = {
+        'synthesizer': form['synthetizer_' + str(id)],
+        'rows': int(form['rows_' + str(id)]),
+        # the same seed and options give the same synthetic data
+        'seed': int(form.get('seed_' + str(id)) or C.SAMPLE_SEED),
+        'enforce_min_max_values': None,
+        'enforce_rounding': None,
+        'epochs': None,
+        'cuda': None,
+        'numerical_distributions': None,
+        'default_distribution': None,
+        'max_fit_rows': None,
+        'fit_sampling': None,
+        'compare_full_fit': False,
+        'early_stopping': None,
+        'patience': None,
+        'max_fit_seconds': None,
+        # compression of the synthetic file, a plain csv if none is chosen
+        'compression': form.get('compression_' + str(id), C.SYNTHETIC_COMPRESSION),
+    }
+    if params['compression'] not in EXTENSIONS:
+        params['compression'] = None
+
+    # fit on a sample of at most the given number of rows, an empty field fits on all the rows
+    if form.get('max_fit_rows_' + str(id)):
+        params['max_fit_rows'] = int(form['max_fit_rows_' + str(id)])
+        params['fit_sampling'] = form.get('fit_sampling_' + str(id), 'stratified')
+        params['compare_full_fit'] = yes_no_parser[form.get('compare_full_fit_' + str(id), 'No')]
+
+    if params['synthesizer'] != 'fast_ml':
+        params['enforce_min_max_values'] = yes_no_parser[form['enforce_min_max_values_' + str(id)]]
+        params['enforce_rounding'] = yes_no_parser[form['enforce_rounding_' + str(id)]]
+
+    if params['synthesizer'] in ['ctgan', 'copulagan', 'tvae']:
+        params['epochs'] = int(form['epochs_' + str(id)])
+        params['cuda'] = yes_no_parser[form['cuda_' + str(id)]]
+
+        # stop when the loss stops improving for the given epochs and when the time budget runs out
+        params['early_stopping'] = yes_no_parser[form.get('early_stopping_' + str(id), 'No')]
+        if params['early_stopping']:
+            params['patience'] = int(form.get('patience_' + str(id)) or C.EARLY_STOPPING_PATIENCE)
+        if form.get('max_fit_minutes_' + str(id)):
+            params['max_fit_seconds'] = int(float(form['max_fit_minutes_' + str(id)]) * 60)
+
+    if params['synthesizer'] in ['gaussian_copula', 'copulagan']:
+        columns_distribution = {}
+        for column in columns:
+            if form[column + '_' + str(id)] != 'none':
+                columns_distribution[column] = form[column + '_' + str(id)]
+
+        if columns_distribution:
+            params['numerical_distributions'] = columns_distribution
+        params['default_distribution'] = form['default_distribution_' + str(id)]
+
+    return params
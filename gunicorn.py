@@ -1,3 +1,12 @@
+import os
+import sys
+
+# the number of workers comes from the configuration of the application, which splits the cores among them
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'App'))
+import config as C
+
+workers = C.WEB_WORKERS
+
 max_requests = 1000
 max_requests_jitter = 50
 